@@ -1,15 +1,57 @@
 # backend/app/deps.py
-import os, redis, psycopg
+import os, redis, orjson
 from psycopg.rows import dict_row
+from psycopg.types.json import set_json_dumps
+from psycopg_pool import ConnectionPool
 from dotenv import load_dotenv
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 REDIS_URL = os.getenv("REDIS_URL")
 
+# Server-side prepare after N executions of the same statement (0 = prepare
+# on first use). Set PREPARE_THRESHOLD=none to disable, e.g. behind a
+# PgBouncer in transaction mode that lacks protocol-level prepared statements.
+_raw_prepare = os.getenv("PREPARE_THRESHOLD", "0").strip().lower()
+PREPARE_THRESHOLD = None if _raw_prepare in ("", "none", "off") else int(_raw_prepare)
+
+def _json_default(o):
+    # orjson handles UUID/datetime natively; only sets and oddballs land here
+    if isinstance(o, set):
+        return list(o)
+    return str(o)
+
+def json_dumps(obj) -> str:
+    return orjson.dumps(obj, default=_json_default, option=orjson.OPT_NON_STR_KEYS).decode()
+
+# Every Json(...)/Jsonb(...) parameter in this process encodes through orjson.
+set_json_dumps(json_dumps)
+
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "5"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "20"))
+
+# One process-wide pool: requests borrow a connection instead of paying
+# TCP+TLS+auth per call, and prepared statements survive across requests.
+# Opened/closed by the app's startup/shutdown hooks (app.main), not at import,
+# so importing this module never touches the network.
+pool = ConnectionPool(
+    DATABASE_URL,
+    min_size=DB_POOL_MIN_SIZE,
+    max_size=DB_POOL_MAX_SIZE,
+    kwargs={"row_factory": dict_row, "prepare_threshold": PREPARE_THRESHOLD},
+    open=False,
+)
+
 def get_db():
-    with psycopg.connect(DATABASE_URL, row_factory=dict_row) as conn:
+    # commits on clean exit, rolls back if the request raised
+    with pool.connection() as conn:
         yield conn
 
+_redis = None
+
 def get_redis():
-    return redis.from_url(REDIS_URL, decode_responses=True)
+    # one client (and its connection pool) per process
+    global _redis
+    if _redis is None:
+        _redis = redis.from_url(REDIS_URL, decode_responses=True)
+    return _redis
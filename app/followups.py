@@ -1,11 +1,12 @@
 # app/followups.py
 import os, json, re, traceback
-from datetime import datetime, timezone, timedelta, date
+from datetime import datetime, timezone, timedelta
 from typing import Any, Dict, List, Optional, TYPE_CHECKING
-from uuid import UUID
 
 from psycopg.types.json import Json  # safe JSON binding for Postgres
 
+from app.deps import json_dumps
+
 # ---- OpenAI client (runtime + type-only) ----
 if TYPE_CHECKING:
     # only used for type checking; not imported at runtime
@@ -98,18 +99,6 @@ def _signature_block(org: dict) -> str:
     sig = (org.get("outbound_signature") or "").strip()
     return sig
 
-def _json_dumps(obj: Any) -> str:
-    """Safe JSON dump for psycopg Json(...), handling UUID/datetime, etc."""
-    def _default(o: Any):
-        if isinstance(o, (datetime, date)):
-            return o.isoformat()
-        if isinstance(o, UUID):
-            return str(o)
-        if isinstance(o, set):
-            return list(o)
-        return str(o)
-    return json.dumps(obj, default=_default)
-
 def _llm_json(system: str, user: str, *, fallback: Dict[str, Any]) -> Dict[str, Any]:
     """
     Ask the LLM to return JSON. If anything fails, return `fallback`.
@@ -294,7 +283,7 @@ def draft_followup_for_missing(db, contact_id: str, missing_labels: List[str], p
     }
     r = db.execute(
         "INSERT INTO messages(contact_id, channel, direction, body, meta) VALUES (%s,'EMAIL','DRAFT',%s,%s) RETURNING id;",
-        (contact_id, body, Json(meta, dumps=_json_dumps)),
+        (contact_id, body, Json(meta, dumps=json_dumps)),
     ).fetchone()
     return r["id"]
 
@@ -376,7 +365,7 @@ def draft_ack_for_inbound(
     }
     r = db.execute(
         "INSERT INTO messages(contact_id, channel, direction, body, meta) VALUES (%s,'EMAIL','DRAFT',%s,%s) RETURNING id;",
-        (contact["id"], body, Json(meta, dumps=_json_dumps)),
+        (contact["id"], body, Json(meta, dumps=json_dumps)),
     ).fetchone()
     return {"id": r["id"], "meta": meta}
 
@@ -10,15 +10,17 @@ from app.decisions import should_autosend
 from app.followups import _portal_url as build_portal_url
 
 import os, json, time, requests, secrets
-from uuid import uuid4, UUID
+from uuid import uuid4
 from typing import Optional, Dict, Any, List
-from datetime import datetime, timedelta, timezone, date
+from datetime import datetime, timedelta, timezone
 from contextlib import contextmanager
 
 import psycopg
 from psycopg.rows import dict_row
 from psycopg.types.json import Json
 
+from app.deps import json_dumps
+
 from dotenv import load_dotenv
 load_dotenv(override=True)
 
@@ -54,20 +56,6 @@ PORTAL_BASE = os.getenv("PORTAL_BASE", "http://localhost:3000")
 # Follow-up heuristics
 FOLLOWUP_DAYS = int(os.getenv("FOLLOWUP_DAYS", "2"))
 
-# ============================================================
-# JSON helper (safe for UUID, datetime, set, etc.)
-# ============================================================
-def _json_dumps(obj):
-    def _default(o):
-        if isinstance(o, (datetime, date)):
-            return o.isoformat()
-        if isinstance(o, UUID):
-            return str(o)
-        if isinstance(o, set):
-            return list(o)
-        return str(o)
-    return json.dumps(obj, default=_default)
-
 # ============================================================
 # DB helper
 # ============================================================
@@ -243,7 +231,7 @@ def _finalize_send(
                meta = COALESCE(meta, '{}'::jsonb) || %s::jsonb
          WHERE id = %s;
         """,
-        (Json(meta_patch, dumps=_json_dumps), message_id),
+        (Json(meta_patch, dumps=json_dumps), message_id),
     )
     conn.execute(
         "UPDATE contacts SET sends_today = sends_today + 1, last_sent_at = NOW(), updated_at = NOW() WHERE id = %s;",
@@ -463,7 +451,7 @@ def on_client_upload(contact_id: str, requirement_id: str | None = None) -> dict
         }
         draft_row = db.execute(
             "INSERT INTO messages(contact_id, channel, direction, body, meta) VALUES (%s,'EMAIL','DRAFT',%s,%s) RETURNING id;",
-            (contact_id, body, Json(drafted_meta, dumps=_json_dumps))
+            (contact_id, body, Json(drafted_meta, dumps=json_dumps))
         ).fetchone()
         draft_id = str(draft_row["id"])
 
@@ -500,7 +488,7 @@ def on_client_upload(contact_id: str, requirement_id: str | None = None) -> dict
 
         db.execute(
             "INSERT INTO timeline(contact_id,type,detail) VALUES (%s,'AUTO_SEND_DECISION',%s);",
-            (contact_id, Json({"message_id": draft_id, **(decision_meta or {})}, dumps=_json_dumps))
+            (contact_id, Json({"message_id": draft_id, **(decision_meta or {})}, dumps=json_dumps))
         )
         db.commit()
 
@@ -511,12 +499,12 @@ def on_client_upload(contact_id: str, requirement_id: str | None = None) -> dict
         q = _get_queue()
         if when and when > now_utc:
             try:
-                from rq.scheduler import Scheduler
-                scheduler = Scheduler("outbound", connection=q.connection)
-                scheduler.enqueue_at(when, "app.jobs.send_message_and_update", draft_id, "EMAIL")
+                q.enqueue_at(when, "app.jobs.send_message_and_update", draft_id, "EMAIL")
                 return {"ok": True, "draft_id": draft_id, "auto_enqueued": True, "scheduled_for": when.isoformat()}
-            except Exception:
-                pass
+            except Exception as e:
+                # leave it a draft rather than send outside the allowed window
+                print(f"[jobs] FAILED to schedule draft {draft_id}: {e}")
+                return {"ok": True, "draft_id": draft_id, "auto_enqueued": False}
 
         q.enqueue("app.jobs.send_message_and_update", draft_id, "EMAIL")
         return {"ok": True, "draft_id": draft_id, "auto_enqueued": True}
@@ -648,7 +636,7 @@ def make_doc_followup_draft(contact_id: str):
             VALUES (%s,'EMAIL','DRAFT',%s,%s)
             RETURNING id;
             """,
-            (contact_id, body, Json({"intent": "doc_followup", "reply_to_message_id": reply_to, "subject": subject}, dumps=_json_dumps)),
+            (contact_id, body, Json({"intent": "doc_followup", "reply_to_message_id": reply_to, "subject": subject}, dumps=json_dumps)),
         ).fetchone()["id"]
         conn.execute(
             "INSERT INTO timeline(contact_id,type,detail) VALUES (%s,'NOTE','Doc follow-up draft created');",
@@ -705,7 +693,7 @@ def on_all_docs_received(contact_id: str) -> dict:
 
         draft = db.execute(
             "INSERT INTO messages(contact_id,channel,direction,body,meta) VALUES (%s,'EMAIL','DRAFT',%s,%s) RETURNING id;",
-            (contact_id, body, Json(meta, dumps=_json_dumps)),
+            (contact_id, body, Json(meta, dumps=json_dumps)),
         ).fetchone()
         draft_id = draft["id"]
         db.execute(
@@ -740,7 +728,7 @@ def on_all_docs_received(contact_id: str) -> dict:
         )
         db.execute(
             "INSERT INTO timeline(contact_id,type,detail) VALUES (%s,'AUTO_SEND_DECISION',%s);",
-            (contact_id, Json({"message_id": draft_id, **(decision_meta or {})}, dumps=_json_dumps)),
+            (contact_id, Json({"message_id": draft_id, **(decision_meta or {})}, dumps=json_dumps)),
         )
         db.commit()
 
@@ -750,12 +738,12 @@ def on_all_docs_received(contact_id: str) -> dict:
         q = _get_queue()
         if when and when > now_utc:
             try:
-                from rq.scheduler import Scheduler
-                scheduler = Scheduler("outbound", connection=q.connection)
-                scheduler.enqueue_at(when, "app.jobs.send_message_and_update", draft_id, "EMAIL")
+                q.enqueue_at(when, "app.jobs.send_message_and_update", draft_id, "EMAIL")
                 return {"ok": True, "draft_id": draft_id, "auto_enqueued": True, "scheduled_for": when.isoformat()}
-            except Exception:
-                pass
+            except Exception as e:
+                # leave it a draft rather than send outside the allowed window
+                print(f"[jobs] FAILED to schedule draft {draft_id}: {e}")
+                return {"ok": True, "draft_id": draft_id, "auto_enqueued": False}
 
         q.enqueue("app.jobs.send_message_and_update", draft_id, "EMAIL")
         return {"ok": True, "draft_id": draft_id, "auto_enqueued": True}
@@ -837,7 +825,7 @@ def react_to_inbound(message_id: str):
         # add threading hints to the just-created draft
         db.execute(
             "UPDATE messages SET meta = COALESCE(meta,'{}'::jsonb) || %s::jsonb WHERE id=%s;",
-            (Json({"reply_to_message_id": reply_to, "subject": subject}, dumps=_json_dumps), draft_id),
+            (Json({"reply_to_message_id": reply_to, "subject": subject}, dumps=json_dumps), draft_id),
         )
 
         # 3) Auto-send decision (FOLLOW-UP rules)
@@ -868,7 +856,7 @@ def react_to_inbound(message_id: str):
 
         db.execute(
             "INSERT INTO timeline(contact_id,type,detail) VALUES (%s,'AUTO_SEND_DECISION',%s);",
-            (c["id"], Json({"message_id": draft_id, **(decision_meta or {})}, dumps=_json_dumps)),
+            (c["id"], Json({"message_id": draft_id, **(decision_meta or {})}, dumps=json_dumps)),
         )
         db.commit()
 
@@ -879,12 +867,7 @@ def react_to_inbound(message_id: str):
         q = _get_queue()
         try:
             if when and when > now_utc:
-                try:
-                    from rq.scheduler import Scheduler
-                    scheduler = Scheduler("outbound", connection=q.connection)
-                    scheduler.enqueue_at(when, "app.jobs.send_message_and_update", draft_id, "EMAIL")
-                except Exception:
-                    q.enqueue("app.jobs.send_message_and_update", draft_id, "EMAIL")
+                q.enqueue_at(when, "app.jobs.send_message_and_update", draft_id, "EMAIL")
             else:
                 q.enqueue("app.jobs.send_message_and_update", draft_id, "EMAIL")
         except Exception:
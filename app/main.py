@@ -1,22 +1,26 @@
 # backend/app/main.py
 
+import os
+import anyio
 from fastapi import FastAPI, Depends, Body, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from psycopg import Connection
-from app.deps import get_db
-from app.routes_settings import router as org_router
+from app.deps import get_db, pool
+from app.routes_settings import router as org_router, start_org_listener
 from app.routes_messages import router as msgs_router
 from app.routes_webhooks import router as webhooks_router
 from app.routes_leads import router as leads_router
-from app.routes_docs import router as docs_router
+from app.routes_docs import router as docs_router, detect_portal_table
 from app.routes_contacts import router as contacts_router
+from app.stream_queue import xadd_send
 # prefer absolute import; fall back to relative if needed
 try:
     from app.queue import get_queue
 except ModuleNotFoundError:
     from .queue import get_queue
 
-app = FastAPI(title="Lawyer Follow-up API")
+app = FastAPI(title="Lawyer Follow-up API", default_response_class=ORJSONResponse)
 app.include_router(contacts_router)
 app.include_router(org_router)
 app.include_router(msgs_router)
@@ -37,6 +41,30 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Sync handlers (and their psycopg calls) run on anyio's threadpool, which
+# defaults to 40 threads; raise it so bursts don't queue behind it.
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "200"))
+
+def _detect_portal_table():
+    # best effort: create_magic_link falls back to detecting on first use
+    try:
+        with pool.connection(timeout=5) as db:
+            detect_portal_table(db)
+    except Exception as e:
+        print(f"[startup] portal table detection deferred: {e}")
+
+@app.on_event("startup")
+async def _startup():
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    # starts min_size connections in the pool's background workers
+    pool.open()
+    start_org_listener()
+    await anyio.to_thread.run_sync(_detect_portal_table)
+
+@app.on_event("shutdown")
+async def _shutdown():
+    await anyio.to_thread.run_sync(pool.close)
+
 # ---------- health ----------
 @app.get("/health")
 def health():
@@ -79,12 +107,11 @@ def api_send_email(
     body_text: str = Body(..., embed=True),
 ):
     """
-    Enqueues an email send via RQ worker (app.jobs.send_email).
+    Enqueues an email send on the outbound stream (consumed by app.stream_queue).
     """
     try:
-        q = get_queue()
-        job = q.enqueue("app.jobs.send_email", to_email, subject, body_text)
-        return {"enqueued": True, "job_id": job.id}
+        entry_id = xadd_send("email", {"to_email": to_email, "subject": subject, "body_text": body_text})
+        return {"enqueued": True, "job_id": entry_id}
     except Exception as e:
         raise HTTPException(500, f"enqueue failed: {e}")
 
@@ -95,11 +122,10 @@ def api_send_sms(
     body_text: str = Body(..., embed=True),
 ):
     """
-    Enqueues an SMS send via RQ worker (app.jobs.send_sms).
+    Enqueues an SMS send on the outbound stream (consumed by app.stream_queue).
     """
     try:
-        q = get_queue()
-        job = q.enqueue("app.jobs.send_sms", to_number, body_text)
-        return {"enqueued": True, "job_id": job.id}
+        entry_id = xadd_send("sms", {"to_number": to_number, "body_text": body_text})
+        return {"enqueued": True, "job_id": entry_id}
     except Exception as e:
         raise HTTPException(500, f"enqueue failed: {e}")
@@ -1,13 +1,23 @@
 # backend/app/queue.py
 import os
-from redis import from_url
+from redis import BlockingConnectionPool, Redis
 from rq import Queue
 from dotenv import load_dotenv
 
 # Ensure .env values override any stale shell exports
 load_dotenv(override=True)
 
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "32"))
+# seconds a caller waits for a free pooled connection before ConnectionError
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", "10"))
+
+_queue: Queue | None = None
+
 def get_queue() -> Queue:
+    # built once per process over a bounded, kept-alive connection pool
+    global _queue
+    if _queue is not None:
+        return _queue
     raw = os.getenv("REDIS_URL") or ""
     # remove ALL whitespace just in case (spaces, tabs, newlines, NBSP)
     url = "".join(raw.split())
@@ -15,5 +25,20 @@ def get_queue() -> Queue:
         raise RuntimeError("REDIS_URL is not set")
     # rediss:// scheme automatically enables TLS; certs are handled
     # by Python's SSL (and you set SSL_CERT_FILE in .env already)
-    redis = from_url(url, decode_responses=True)
-    return Queue("outbound", connection=redis)
+    # blocking: a burst of BackgroundTask enqueues (threadpool is far wider than
+    # the pool) waits its turn instead of failing with "Too many connections"
+    pool = BlockingConnectionPool.from_url(
+        url,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        timeout=REDIS_POOL_TIMEOUT,
+        decode_responses=True,
+    )
+    _queue = Queue("outbound", connection=Redis(connection_pool=pool))
+    return _queue
+
+def enqueue_safe(func, *args):
+    """For BackgroundTasks: enqueue after the response; failures are logged, not raised."""
+    try:
+        get_queue().enqueue(func, *args)
+    except Exception as e:
+        print(f"[queue] FAILED to enqueue {func}: {e}")
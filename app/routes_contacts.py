@@ -1,7 +1,8 @@
 # backend/app/routes_contacts.py
-from fastapi import APIRouter, Depends, HTTPException, Body
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Body
 from psycopg import Connection
 from datetime import datetime, timezone
+import time
 from app.deps import get_db
 
 # reuse your docs-request creator from routes_messages
@@ -9,11 +10,19 @@ from app.routes_messages import draft_initial as draft_initial_docs
 
 router = APIRouter(prefix="/contacts", tags=["contacts"])
 
+# Inbox polls this list constantly; a couple of seconds of staleness is fine.
+LIST_TTL_SECONDS = 2.0
+_list_cache: tuple[float, list] | None = None  # (fetched_at, rows)
+
 # -------------------------------------------------------------------
 # List contacts (used by Inbox)
 # -------------------------------------------------------------------
 @router.get("")
 def list_contacts(db: Connection = Depends(get_db)):
+    global _list_cache
+    now = time.monotonic()
+    if _list_cache and now - _list_cache[0] < LIST_TTL_SECONDS:
+        return _list_cache[1]
     rows = db.execute(
         """
         SELECT id, first_name, last_name, email, phone, status
@@ -21,6 +30,7 @@ def list_contacts(db: Connection = Depends(get_db)):
         ORDER BY updated_at DESC, created_at DESC;
         """
     ).fetchall()
+    _list_cache = (now, rows)
     return rows
 
 # Optional: fetch a single contact
@@ -40,7 +50,12 @@ def get_contact(contact_id: str, db: Connection = Depends(get_db)):
 # docs-request draft using your new flow.
 # -------------------------------------------------------------------
 @router.post("")
-def create_contact(payload: dict = Body(...), db: Connection = Depends(get_db)):
+def create_contact(
+    background: BackgroundTasks,
+    payload: dict = Body(...),
+    db: Connection = Depends(get_db),
+):
+    global _list_cache
     first = (payload.get("first_name") or "").strip() or None
     last  = (payload.get("last_name")  or "").strip() or None
     email = (payload.get("email")      or "").strip() or None
@@ -59,15 +74,17 @@ def create_contact(payload: dict = Body(...), db: Connection = Depends(get_db)):
         """,
         (first, last, email, phone, matter),
     ).fetchone()
-    contact_id = str(row["id"])
+    contact_id = row["id"]
     db.commit()
+    _list_cache = None  # new contact should show up in the Inbox right away
 
     result = {"ok": True, "id": contact_id}
 
     # Optionally create the initial docs-request draft right now
     if draft_docs:
         try:
-            draft_resp = draft_initial_docs(contact_id, {}, db)  # call your existing route function
+            # keyword args: called directly, so FastAPI won't resolve Depends/Body for us
+            draft_resp = draft_initial_docs(contact_id, background, payload={}, db=db)
             result["draft"] = draft_resp
         except Exception as e:
             # Do not fail the contact creation if drafting errors out
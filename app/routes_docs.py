@@ -1,22 +1,21 @@
 # backend/app/routes_docs.py
 
-from fastapi import APIRouter, Depends, HTTPException, Body, Query
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, HTTPException, Body, Query, BackgroundTasks
+from fastapi.responses import ORJSONResponse
 from psycopg import Connection
 from psycopg.types.json import Json
-from datetime import datetime, timezone, timedelta, date
-from uuid import UUID
+from datetime import datetime, timezone, timedelta
 
 import os
+import base64
 import secrets
-import hashlib
-import time
-import json
+import threading
 
-from app.followups import generate_initial_docs_request, _portal_url as build_portal_url
-from app.deps import get_db
+from app.followups import generate_initial_docs_request
+from app.deps import get_db, get_redis
 from app.decisions import should_autosend
-from app.queue import get_queue
+from app.queue import enqueue_safe, get_queue
+from app.routes_settings import cached_org_row
 
 router = APIRouter(prefix="/docs", tags=["docs"])
 
@@ -25,22 +24,60 @@ router = APIRouter(prefix="/docs", tags=["docs"])
 # ---------------------------------------------------------------------
 
 BUCKET = os.getenv("UPLOADS_BUCKET") or os.getenv("SUPABASE_BUCKET") or "uploads"
+PORTAL_BASE = os.getenv("PORTAL_BASE", "http://localhost:3000").rstrip("/")
+SENDER_NAME = os.getenv("SENDER_NAME", "Law Firm")
+
+# Which table backs magic links is a deploy-time fact: detected once (at
+# startup, or lazily on first use) and reused for every request.
+_portal_table: str | None = None
+
+_MAGIC_LINK_INSERT_SQL = {
+    "portal_tokens": "insert into portal_tokens(token, contact_id, expires_at) values (%s,%s,%s) returning token;",
+    "magic_links": "insert into magic_links (contact_id, purpose, expires_at) values (%s, 'UPLOAD', %s) returning token;",
+}
+
+# Portal tokens never change until they expire, so portal_init/portal_upload
+# remember token -> "contact_id|expires_epoch" in Redis for the token's own
+# lifetime. Only portal_tokens rows are cached; magic_links keep going to PG.
+PORTAL_TOKEN_CACHE_PREFIX = "ptok:"
+PORTAL_TOKEN_CACHE_MAX_TTL = 24 * 3600  # for tokens without an expiry
 
 def _json500(detail: str):
     """Uniform JSON 500 so frontends never try to parse HTML."""
-    return JSONResponse(status_code=500, content={"detail": detail})
-
-def _json_dumps(obj):
-    """Safe JSON dumper for psycopg Json(...), handling UUID/datetime/set."""
-    def _default(o):
-        if isinstance(o, (datetime, date)):
-            return o.isoformat()
-        if isinstance(o, UUID):
-            return str(o)
-        if isinstance(o, set):
-            return list(o)
-        return str(o)
-    return json.dumps(obj, default=_default)
+    return ORJSONResponse(status_code=500, content={"detail": detail})
+
+def _schedule_safe(when: datetime, func: str, *args):
+    # rq's native scheduling; released by the scheduler service (worker_simple.py --scheduler)
+    try:
+        get_queue().enqueue_at(when, func, *args)
+    except Exception as e:
+        print(f"[queue] FAILED to schedule {func} at {when.isoformat()}: {e}")
+
+def _cached_portal_token(token: str):
+    """(contact_id, expires_at | None) from Redis, or None on a miss/Redis error."""
+    try:
+        hit = get_redis().get(PORTAL_TOKEN_CACHE_PREFIX + token)
+    except Exception:
+        return None
+    if not hit:
+        return None
+    contact_id, _, exp = hit.partition("|")
+    expires_at = datetime.fromtimestamp(float(exp), timezone.utc) if exp else None
+    return contact_id, expires_at
+
+def _cache_portal_token(token: str, contact_id, expires_at):
+    if expires_at:
+        ttl = int((expires_at - datetime.now(timezone.utc)).total_seconds())
+        if ttl <= 0:
+            return
+        ttl = min(ttl, PORTAL_TOKEN_CACHE_MAX_TTL)
+    else:
+        ttl = PORTAL_TOKEN_CACHE_MAX_TTL
+    exp = str(expires_at.timestamp()) if expires_at else ""
+    try:
+        get_redis().set(PORTAL_TOKEN_CACHE_PREFIX + token, f"{contact_id}|{exp}", ex=ttl)
+    except Exception:
+        pass
 
 def _get_contact(db: Connection, contact_id: str):
     row = db.execute(
@@ -48,16 +85,66 @@ def _get_contact(db: Connection, contact_id: str):
         "from contacts where id=%s;",
         (contact_id,),
     ).fetchone()
-    return dict(row) if row else None
-
-def _contact_exists(db: Connection, contact_id: str) -> bool:
-    row = db.execute("select 1 from contacts where id=%s;", (contact_id,)).fetchone()
-    return bool(row)
+    return row  # dict_row (pool-level): already a dict, or None
+
+# Portal/magic-link tokens come out of a urandom buffer refilled 4 KiB at a
+# time, so minting a token is a slice rather than a syscall. The buffer is
+# dropped after fork so workers never hand out the same bytes.
+_RAND_REFILL = 4096
+_rand_buf = bytearray()
+_rand_pid = os.getpid()
+_rand_lock = threading.Lock()
+
+def _urlsafe_token(nbytes: int = 24) -> str:
+    """Same shape as secrets.token_urlsafe(nbytes), minus the per-call urandom read."""
+    global _rand_pid
+    with _rand_lock:
+        if _rand_pid != os.getpid():
+            _rand_buf.clear()
+            _rand_pid = os.getpid()
+        if len(_rand_buf) < nbytes:
+            _rand_buf[:] = os.urandom(max(_RAND_REFILL, nbytes))
+        raw = bytes(_rand_buf[:nbytes])
+        del _rand_buf[:nbytes]
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
 
 def _short_code(label: str) -> str:
-    """Short deterministic-ish code without requiring pgcrypto."""
-    seed = f"{label}|{time.time_ns()}"
-    return hashlib.md5(seed.encode("utf-8")).hexdigest()[:12]
+    """Short random 12-hex-char code (the label never made it deterministic)."""
+    return secrets.token_hex(6)
+
+def _add_requirements(
+    db: Connection,
+    contact_id: str,
+    matter_type: str,
+    labels: list[str],
+    *,
+    description: str | None = None,
+    is_required: bool = True,
+) -> list:
+    """
+    Create one document_requirements row per label and link each to the
+    contact as a PENDING client_documents row. Single round-trip; returns
+    the new requirement ids.
+    """
+    rows = db.execute(
+        """
+        with req as (
+          insert into document_requirements (matter_type, code, label, description, is_required)
+          select %s, t.code, t.label, %s::text, %s::boolean
+            from unnest(%s::text[], %s::text[]) as t(code, label)
+          returning id
+        )
+        insert into client_documents (contact_id, requirement_id, status, source, created_by)
+        select %s, id, 'PENDING', 'MANUAL', 'LAWYER' from req
+        returning requirement_id;
+        """,
+        (
+            matter_type, description, is_required,
+            [_short_code(l) for l in labels], labels,
+            contact_id,
+        ),
+    ).fetchall()
+    return [r["requirement_id"] for r in rows]
 
 def _table_exists(db: Connection, name: str) -> bool:
     row = db.execute("""
@@ -68,6 +155,16 @@ def _table_exists(db: Connection, name: str) -> bool:
     """, (name,)).fetchone()
     return bool(row["ok"])
 
+def detect_portal_table(db: Connection) -> str | None:
+    """portal_tokens if present, else magic_links, else None (cached once found)."""
+    global _portal_table
+    if _portal_table is None:
+        for name in ("portal_tokens", "magic_links"):
+            if _table_exists(db, name):
+                _portal_table = name
+                break
+    return _portal_table
+
 def _ensure_portal_token(db: Connection, contact_id: str, *, ttl_days: int = 30) -> str:
     tok = db.execute(
         "SELECT token FROM portal_tokens WHERE contact_id=%s AND (expires_at IS NULL OR expires_at>now()) LIMIT 1;",
@@ -75,7 +172,7 @@ def _ensure_portal_token(db: Connection, contact_id: str, *, ttl_days: int = 30)
     ).fetchone()
     if tok:
         return tok["token"]
-    token = secrets.token_urlsafe(24)
+    token = _urlsafe_token()
     exp = datetime.now(timezone.utc) + timedelta(days=ttl_days)
     db.execute(
         "INSERT INTO portal_tokens(token, contact_id, expires_at) VALUES (%s,%s,%s);",
@@ -84,12 +181,11 @@ def _ensure_portal_token(db: Connection, contact_id: str, *, ttl_days: int = 30)
     return token
 
 def _portal_url(db: Connection, contact_id: str) -> str:
-    base = os.getenv("PORTAL_BASE", "http://localhost:3000")
     token = _ensure_portal_token(db, contact_id, ttl_days=30)
-    return f"{base}/portal/{token}"
+    return f"{PORTAL_BASE}/portal/{token}"
 
 def _org_settings(db: Connection):
-    row = db.execute("SELECT * FROM org_settings LIMIT 1;").fetchone()
+    row = cached_org_row(db)
     if not row:
         return {
             "require_approval_initial": True,
@@ -100,47 +196,86 @@ def _org_settings(db: Connection):
             "cooldown_hours": 22,
             "max_daily_sends": 2,
             "grace_minutes": 5,
-            "outbound_from_name": os.getenv("SENDER_NAME", "Law Firm"),
+            "outbound_from_name": SENDER_NAME,
             "include_signature": False,
             "signature": "",
         }
-    row = dict(row)
-    row.setdefault("outbound_from_name", os.getenv("SENDER_NAME", "Law Firm"))
+    row.setdefault("outbound_from_name", SENDER_NAME)
     row.setdefault("include_signature", False)
     row.setdefault("signature", "")
     return row
 
-def _latest_provider_msgid_and_subject(db: Connection, contact_id: str):
+def _kickoff_context(db: Connection, contact_id: str, *, ttl_days: int = 30):
     """
-    Return most recent provider_message_id and subject for this contact, if any.
+    All of kickoff's reads in one round-trip: the contact row, a live portal
+    token (minted here if the contact has none), its required+pending labels
+    (sorted) and the most recent provider_message_id. Also used by
+    routes_messages' initial-docs draft.
+    Returns None if the contact doesn't exist.
     """
     return db.execute(
         """
+        WITH c AS (
+          SELECT id, first_name, last_name, email, phone, matter_type,
+                 dnc, last_sent_at, sends_today
+            FROM contacts
+           WHERE id = %s
+        ), existing AS (
+          SELECT token
+            FROM portal_tokens
+           WHERE contact_id = (SELECT id FROM c)
+             AND (expires_at IS NULL OR expires_at > now())
+           LIMIT 1
+        ), minted AS (
+          INSERT INTO portal_tokens(token, contact_id, expires_at)
+          SELECT %s::text, c.id, %s::timestamptz
+            FROM c
+           WHERE NOT EXISTS (SELECT 1 FROM existing)
+          RETURNING token
+        )
         SELECT
-          meta->>'provider_message_id' AS pmid,
-          COALESCE(meta->>'subject', meta->>'subject_used') AS subj
-        FROM messages
-        WHERE contact_id = %s
-          AND (meta->>'provider_message_id') IS NOT NULL
-        ORDER BY created_at DESC
-        LIMIT 1;
+          c.*,
+          COALESCE((SELECT token FROM existing), (SELECT token FROM minted)) AS token,
+          COALESCE((
+            SELECT array_agg(dr.label ORDER BY dr.label)
+              FROM client_documents cd
+              JOIN document_requirements dr ON dr.id = cd.requirement_id
+             WHERE cd.contact_id = c.id
+               AND COALESCE(cd.is_required, dr.is_required) = TRUE
+               AND cd.status = 'PENDING'
+          ), '{}') AS labels,
+          (
+            SELECT meta->>'provider_message_id'
+              FROM messages
+             WHERE contact_id = c.id
+               AND (meta->>'provider_message_id') IS NOT NULL
+             ORDER BY created_at DESC
+             LIMIT 1
+          ) AS pmid
+        FROM c;
         """,
-        (contact_id,),
+        (
+            contact_id,
+            _urlsafe_token(),
+            datetime.now(timezone.utc) + timedelta(days=ttl_days),
+        ),
     ).fetchone()
 
-def _all_required_pending_count(db: Connection, contact_id: str) -> int:
+def _any_required_pending(db: Connection, contact_id: str) -> bool:
     rec = db.execute(
         """
-        SELECT COUNT(*) AS n
-          FROM client_documents cd
-          JOIN document_requirements dr ON dr.id = cd.requirement_id
-         WHERE cd.contact_id = %s
-           AND COALESCE(cd.is_required, dr.is_required) = TRUE
-           AND cd.status = 'PENDING';
+        SELECT EXISTS(
+          SELECT 1
+            FROM client_documents cd
+            JOIN document_requirements dr ON dr.id = cd.requirement_id
+           WHERE cd.contact_id = %s
+             AND COALESCE(cd.is_required, dr.is_required) = TRUE
+             AND cd.status = 'PENDING'
+        ) AS any;
         """,
         (contact_id,),
     ).fetchone()
-    return int(rec["n"] if rec else 0)
+    return bool(rec and rec["any"])
 
 # ---------------------------------------------------------------------
 # Checklist (lawyer console)
@@ -148,42 +283,49 @@ def _all_required_pending_count(db: Connection, contact_id: str) -> int:
 
 @router.get("/checklist/{contact_id}")
 def checklist(contact_id: str, db: Connection = Depends(get_db)):
-    if not _contact_exists(db, contact_id):
-        raise HTTPException(404, "contact not found")
-
-    items = db.execute(
-        """
-        select cd.id as client_doc_id,
-               cd.requirement_id,
-               dr.code,
-               dr.label,
-               dr.description,
-               dr.is_required,
-               cd.status,
-               cd.notes,
-               cd.uploaded_at,
-               cd.reviewed_at,
-               cd.source,
-               cd.created_by
-        from client_documents cd
-        join document_requirements dr on dr.id = cd.requirement_id
-        where cd.contact_id = %s
-        order by dr.label asc;
-        """,
-        (contact_id,),
-    ).fetchall()
-
-    files = db.execute(
+    # Postgres builds the whole {"items": [...], "files": [...]} document;
+    # no row -> unknown contact. One round-trip, no per-row dicts in Python.
+    row = db.execute(
         """
-        select id, requirement_id, storage_bucket, storage_path, bytes, mime_type, created_at
-        from files
-        where contact_id = %s
-        order by created_at desc;
+        select jsonb_build_object(
+          'items', coalesce((
+            select jsonb_agg(i order by i.label)
+            from (
+              select cd.id as client_doc_id,
+                     cd.requirement_id,
+                     dr.code,
+                     dr.label,
+                     dr.description,
+                     dr.is_required,
+                     cd.status,
+                     cd.notes,
+                     cd.uploaded_at,
+                     cd.reviewed_at,
+                     cd.source,
+                     cd.created_by
+              from client_documents cd
+              join document_requirements dr on dr.id = cd.requirement_id
+              where cd.contact_id = c.id
+            ) i
+          ), '[]'::jsonb),
+          'files', coalesce((
+            select jsonb_agg(f order by f.created_at desc)
+            from (
+              select id, requirement_id, storage_bucket, storage_path, bytes, mime_type, created_at
+              from files
+              where contact_id = c.id
+            ) f
+          ), '[]'::jsonb)
+        ) as payload
+        from contacts c
+        where c.id = %s;
         """,
         (contact_id,),
-    ).fetchall()
+    ).fetchone()
+    if not row:
+        raise HTTPException(404, "contact not found")
 
-    return {"items": items, "files": files}
+    return ORJSONResponse(row["payload"])
 
 @router.post("/custom/{contact_id}/add")
 def add_custom_requirement(
@@ -191,10 +333,9 @@ def add_custom_requirement(
     payload: dict = Body(...),
     db: Connection = Depends(get_db),
 ):
-    if not _contact_exists(db, contact_id):
-        raise HTTPException(404, "contact not found")
-
     c = _get_contact(db, contact_id)
+    if not c:
+        raise HTTPException(404, "contact not found")
     mt = (c.get("matter_type") or "GENERAL").strip()
 
     label = (payload.get("label") or "").strip()
@@ -203,22 +344,8 @@ def add_custom_requirement(
     if not label:
         raise HTTPException(400, "label required")
 
-    r = db.execute(
-        """
-        insert into document_requirements (matter_type, code, label, description, is_required)
-        values (%s, %s, %s, %s, %s)
-        returning id;
-        """,
-        (mt, _short_code(label), label, description, is_required),
-    ).fetchone()
-    req_id = r["id"]
-
-    db.execute(
-        """
-        insert into client_documents (contact_id, requirement_id, status, source, created_by)
-        values (%s, %s, 'PENDING', 'MANUAL', 'LAWYER');
-        """,
-        (contact_id, req_id),
+    [req_id] = _add_requirements(
+        db, contact_id, mt, [label], description=description, is_required=is_required
     )
     db.commit()
     return {"ok": True, "requirement_id": req_id}
@@ -229,10 +356,9 @@ def bulk_add_requirements(
     payload: dict = Body(...),
     db: Connection = Depends(get_db),
 ):
-    if not _contact_exists(db, contact_id):
-        raise HTTPException(404, "contact not found")
-
     c = _get_contact(db, contact_id)
+    if not c:
+        raise HTTPException(404, "contact not found")
     mt = (c.get("matter_type") or "GENERAL").strip()
 
     labels = payload.get("labels") or []
@@ -240,26 +366,7 @@ def bulk_add_requirements(
     if not labels:
         raise HTTPException(400, "labels required")
 
-    added = 0
-    for label in labels:
-        r = db.execute(
-            """
-            insert into document_requirements (matter_type, code, label, description, is_required)
-            values (%s, %s, %s, null, true)
-            returning id;
-            """,
-            (mt, _short_code(label), label),
-        ).fetchone()
-        req_id = r["id"]
-        db.execute(
-            """
-            insert into client_documents (contact_id, requirement_id, status, source, created_by)
-            values (%s, %s, 'PENDING', 'MANUAL', 'LAWYER');
-            """,
-            (contact_id, req_id),
-        )
-        added += 1
-
+    added = len(_add_requirements(db, contact_id, mt, labels))
     db.commit()
     return {"ok": True, "added": added}
 
@@ -268,31 +375,25 @@ def bulk_add_requirements(
 # ---------------------------------------------------------------------
 
 @router.post("/kickoff/{contact_id}")
-def kickoff_docs_request(contact_id: str, db: Connection = Depends(get_db)):
-    # 1) contact
-    c = _get_contact(db, contact_id)
+def kickoff_docs_request(
+    contact_id: str,
+    background: BackgroundTasks,
+    db: Connection = Depends(get_db),
+):
+    # 1) contact + portal token + required/pending labels + last provider
+    #    message id (one round-trip)
+    c = _kickoff_context(db, contact_id)
     if not c:
         raise HTTPException(status_code=404, detail="Contact not found")
     if c.get("dnc"):
         raise HTTPException(status_code=400, detail="Contact is DNC")
 
-    # 2) gather required + pending labels
-    missing_rows = db.execute(
-        """
-        SELECT dr.label
-          FROM client_documents cd
-          JOIN document_requirements dr ON dr.id = cd.requirement_id
-         WHERE cd.contact_id = %s
-           AND COALESCE(cd.is_required, dr.is_required) = TRUE
-           AND cd.status = 'PENDING'
-         ORDER BY dr.label;
-        """,
-        (contact_id,),
-    ).fetchall()
-    missing_labels = [r["label"] for r in missing_rows]
+    # 2) labels + threading hint (initial may still be a reply)
+    missing_labels = list(c.pop("labels") or [])
+    reply_to = c.pop("pmid") or None
 
     # 3) portal + org
-    portal = build_portal_url(db, contact_id, os.getenv("PORTAL_BASE", "http://localhost:3000"))
+    portal = f"{PORTAL_BASE}/portal/{c.pop('token')}"
     org = _org_settings(db)
 
     # 4) AI-generate a context-specific initial docs request
@@ -300,10 +401,6 @@ def kickoff_docs_request(contact_id: str, db: Connection = Depends(get_db)):
     body = gen["body"]
     subject = gen["subject"]  # keep as-is for the initial
 
-    # Thread with last provider message if one exists (initial may still be reply)
-    prev = _latest_provider_msgid_and_subject(db, contact_id)
-    reply_to = (prev and prev["pmid"]) or None
-
     meta = {
         "intent": gen.get("intent", "initial_docs_request"),
         "confidence": gen.get("confidence", 0.92),
@@ -314,23 +411,7 @@ def kickoff_docs_request(contact_id: str, db: Connection = Depends(get_db)):
         "_llm": gen.get("_llm"),
     }
 
-    # 5) persist the draft
-    draft_row = db.execute(
-        """
-        INSERT INTO messages(contact_id, channel, direction, body, meta)
-        VALUES (%s,'EMAIL','DRAFT',%s,%s)
-        RETURNING id;
-        """,
-        (contact_id, body, Json(meta, dumps=_json_dumps)),
-    ).fetchone()
-    draft_id = str(draft_row["id"])
-
-    db.execute(
-        "INSERT INTO timeline(contact_id,type,detail) VALUES (%s,'NOTE','Initial docs request drafted (AI)');",
-        (contact_id,),
-    )
-
-    # 6) auto-send decision (INITIAL)
+    # 5) auto-send decision (INITIAL)
     now_utc = datetime.now(timezone.utc)
     allowed, decision_meta, when = should_autosend(
         {
@@ -355,30 +436,44 @@ def kickoff_docs_request(contact_id: str, db: Connection = Depends(get_db)):
         }
     )
 
-    db.execute(
-        "INSERT INTO timeline(contact_id,type,detail) VALUES (%s,'AUTO_SEND_DECISION',%s);",
-        (contact_id, Json({"message_id": draft_id, **(decision_meta or {})}, dumps=_json_dumps)),
-    )
+    # 6) persist draft + timeline note + decision in a single statement
+    draft_row = db.execute(
+        """
+        WITH draft AS (
+          INSERT INTO messages(contact_id, channel, direction, body, meta)
+          VALUES (%s,'EMAIL','DRAFT',%s,%s)
+          RETURNING id
+        ), note AS (
+          INSERT INTO timeline(contact_id,type,detail)
+          VALUES (%s,'NOTE','Initial docs request drafted (AI)')
+          RETURNING id
+        )
+        -- reading note's RETURNING puts the NOTE row in first (lower id
+        -- under the shared now()), as when these were separate statements
+        INSERT INTO timeline(contact_id,type,detail)
+        SELECT %s,'AUTO_SEND_DECISION',
+               jsonb_build_object('message_id', draft.id::text) || %s::jsonb
+          FROM draft CROSS JOIN note
+        RETURNING (SELECT id FROM draft) AS id;
+        """,
+        (
+            contact_id, body, Json(meta),
+            contact_id,
+            contact_id, Json(decision_meta or {}),
+        ),
+    ).fetchone()
+    draft_id = str(draft_row["id"])
     db.commit()
 
-    # 7) enqueue send if allowed
-    auto_enqueued = False
+    # 7) enqueue send if allowed (after the response; stays a draft if queueing fails)
+    auto_enqueued = bool(allowed)
     scheduled_for = None
     if allowed:
-        q = get_queue()
-        try:
-            if when and when > now_utc:
-                from rq.scheduler import Scheduler
-                scheduler = Scheduler("outbound", connection=q.connection)
-                scheduler.enqueue_at(when, "app.jobs.send_message_and_update", draft_id, "EMAIL")
-                auto_enqueued = True
-                scheduled_for = when.isoformat()
-            else:
-                q.enqueue("app.jobs.send_message_and_update", draft_id, "EMAIL")
-                auto_enqueued = True
-        except Exception:
-            # leave as draft if queueing fails
-            pass
+        if when and when > now_utc:
+            background.add_task(_schedule_safe, when, "app.jobs.send_message_and_update", draft_id, "EMAIL")
+            scheduled_for = when.isoformat()
+        else:
+            background.add_task(enqueue_safe, "app.jobs.send_message_and_update", draft_id, "EMAIL")
 
     return {
         "id": draft_id,
@@ -394,7 +489,11 @@ def kickoff_docs_request(contact_id: str, db: Connection = Depends(get_db)):
 # ---------------------------------------------------------------------
 
 @router.post("/review/approve")
-def approve_doc(payload: dict = Body(...), db: Connection = Depends(get_db)):
+def approve_doc(
+    background: BackgroundTasks,
+    payload: dict = Body(...),
+    db: Connection = Depends(get_db),
+):
     contact_id = (payload.get("contact_id") or "").strip()
     requirement_id = (payload.get("requirement_id") or "").strip()
     if not contact_id or not requirement_id:
@@ -424,13 +523,8 @@ def approve_doc(payload: dict = Body(...), db: Connection = Depends(get_db)):
     )
 
     # If this approval completes the checklist (no required PENDING), cue a courteous confirmation
-    if _all_required_pending_count(db, contact_id) == 0:
-        try:
-            q = get_queue()
-            q.enqueue("app.jobs.on_all_docs_received", contact_id)
-        except Exception:
-            # non-fatal: just skip the courtesy note if enqueue fails
-            pass
+    if not _any_required_pending(db, contact_id):
+        background.add_task(enqueue_safe, "app.jobs.on_all_docs_received", contact_id)
 
     db.commit()
     return {"ok": True, "status": "APPROVED"}
@@ -447,7 +541,7 @@ def reject_upload(
 
     if not contact_id or not requirement_id:
         raise HTTPException(400, "contact_id and requirement_id required")
-    if not _contact_exists(db, contact_id):
+    if not _get_contact(db, contact_id):
         raise HTTPException(404, "contact not found")
 
     row = db.execute(
@@ -477,7 +571,7 @@ def reject_upload(
             values (%s,'EMAIL','DRAFT',%s,%s)
             returning id;
             """,
-            (contact_id, body, Json({"intent": "doc_fix"}, dumps=_json_dumps)),
+            (contact_id, body, Json({"intent": "doc_fix"})),
         ).fetchone()
         followup = {"draft_id": msg["id"]}
 
@@ -498,110 +592,85 @@ def create_magic_link(contact_id: str, db: Connection = Depends(get_db)):
     if not exists:
         raise HTTPException(404, "contact not found")
 
-    expires_at = datetime.now(timezone.utc) + timedelta(days=7)
+    table = detect_portal_table(db)
+    if not table:
+        return _json500("neither portal_tokens nor magic_links table exists; create one")
 
-    has_portal = _table_exists(db, "portal_tokens")
-    has_magic  = _table_exists(db, "magic_links")
+    expires_at = datetime.now(timezone.utc) + timedelta(days=7)
+    if table == "portal_tokens":
+        params = (_urlsafe_token(), contact_id, expires_at)
+    else:
+        params = (contact_id, expires_at)
 
-    if has_portal:
-        try:
-            token = secrets.token_urlsafe(24)
-            db.execute(
-                "insert into portal_tokens(token, contact_id, expires_at) values (%s,%s,%s);",
-                (token, contact_id, expires_at),
-            )
-            db.commit()
-            return {"token": token, "expires_at": expires_at.isoformat()}
-        except Exception as e1:
-            try:
-                db.rollback()
-            except Exception:
-                pass
-            if not has_magic:
-                return _json500(f"portal_tokens insert failed and magic_links not present: {e1}")
-            try:
-                rec = db.execute(
-                    """
-                    insert into magic_links (contact_id, purpose, expires_at)
-                    values (%s, 'UPLOAD', %s)
-                    returning token;
-                    """,
-                    (contact_id, expires_at),
-                ).fetchone()
-                db.commit()
-                return {"token": str(rec["token"]), "expires_at": expires_at.isoformat()}
-            except Exception as e2:
-                try:
-                    db.rollback()
-                except Exception:
-                    pass
-                return _json500(f"magic_links fallback failed: {e2}")
-
-    elif has_magic:
+    try:
+        rec = db.execute(_MAGIC_LINK_INSERT_SQL[table], params).fetchone()
+        db.commit()
+    except Exception as e:
         try:
-            rec = db.execute(
-                """
-                insert into magic_links (contact_id, purpose, expires_at)
-                values (%s, 'UPLOAD', %s)
-                returning token;
-                """,
-                (contact_id, expires_at),
-            ).fetchone()
-            db.commit()
-            return {"token": str(rec["token"]), "expires_at": expires_at.isoformat()}
-        except Exception as e:
-            try:
-                db.rollback()
-            except Exception:
-                pass
-            return _json500(f"magic_links insert failed: {e}")
+            db.rollback()
+        except Exception:
+            pass
+        return _json500(f"{table} insert failed: {e}")
 
-    else:
-        return _json500("neither portal_tokens nor magic_links table exists; create one")
+    return {"token": str(rec["token"]), "expires_at": expires_at.isoformat()}
 
 @router.get("/portal/{token}")
 def portal_init(token: str, db: Connection = Depends(get_db)):
     try:
-        rec = db.execute(
-            """
-            with t as (
-              select contact_id, expires_at from portal_tokens where token = %s
+        cached = _cached_portal_token(token)
+        if cached:
+            contact_id, expires_at = cached
+            if expires_at and expires_at < datetime.now(timezone.utc):
+                raise HTTPException(410, "link expired")
+            # token already validated: go straight to contact + checklist
+            tok_sql = "select c.id as contact_id, %s::timestamptz as expires_at, 'cache' as src from contacts c where c.id = %s"
+            tok_params = (expires_at, contact_id)
+        else:
+            tok_sql = """
+              (select contact_id, expires_at, 'portal_tokens' as src from portal_tokens where token = %s limit 1)
               union all
-              select contact_id, expires_at from magic_links where token::text = %s
-            )
-            select t.contact_id, t.expires_at,
-                   c.first_name, c.last_name, c.email, c.phone, c.matter_type
+              (select contact_id, expires_at, 'magic_links' as src from magic_links where token::text = %s limit 1)
+              limit 1
+            """
+            tok_params = (token, token)
+
+        # token -> contact -> checklist items in one round-trip; items come
+        # back as a jsonb array already ordered by label
+        rec = db.execute(
+            f"""
+            with t as ({tok_sql})
+            select t.contact_id, t.expires_at, t.src,
+                   c.first_name, c.last_name, c.email, c.phone, c.matter_type,
+                   coalesce((
+                     select jsonb_agg(i order by i.label)
+                     from (
+                       select cd.id as client_doc_id,
+                              cd.requirement_id,
+                              dr.code,
+                              dr.label,
+                              dr.description,
+                              dr.is_required,
+                              cd.status,
+                              cd.notes,
+                              cd.uploaded_at,
+                              cd.reviewed_at
+                       from client_documents cd
+                       join document_requirements dr on dr.id = cd.requirement_id
+                       where cd.contact_id = t.contact_id
+                     ) i
+                   ), '[]'::jsonb) as items
             from t
-            join contacts c on c.id = t.contact_id
-            limit 1;
+            join contacts c on c.id = t.contact_id;
             """,
-            (token, token),
+            tok_params,
         ).fetchone()
 
         if not rec:
             raise HTTPException(404, "invalid or unknown link")
         if rec["expires_at"] and rec["expires_at"] < datetime.now(timezone.utc):
             raise HTTPException(410, "link expired")
-
-        items = db.execute(
-            """
-            select cd.id as client_doc_id,
-                   cd.requirement_id,
-                   dr.code,
-                   dr.label,
-                   dr.description,
-                   dr.is_required,
-                   cd.status,
-                   cd.notes,
-                   cd.uploaded_at,
-                   cd.reviewed_at
-            from client_documents cd
-            join document_requirements dr on dr.id = cd.requirement_id
-            where cd.contact_id = %s
-            order by dr.label asc;
-            """,
-            (rec["contact_id"],),
-        ).fetchall()
+        if rec["src"] == "portal_tokens":
+            _cache_portal_token(token, rec["contact_id"], rec["expires_at"])
 
         return {
             "contact": {
@@ -612,7 +681,7 @@ def portal_init(token: str, db: Connection = Depends(get_db)):
                 "phone": rec["phone"],
                 "matter_type": rec["matter_type"],
             },
-            "items": items,
+            "items": rec["items"],
             "expires_at": rec["expires_at"].isoformat() if rec["expires_at"] else None,
         }
     except HTTPException:
@@ -623,6 +692,7 @@ def portal_init(token: str, db: Connection = Depends(get_db)):
 @router.post("/portal/{token}/upload")
 def portal_upload(
     token: str,
+    background: BackgroundTasks,
     payload: dict = Body(...),
     db: Connection = Depends(get_db),
 ):
@@ -634,16 +704,6 @@ def portal_upload(
       - or say “all set” if this was the last item
     """
     try:
-        t = db.execute(
-            "select contact_id, expires_at from portal_tokens where token=%s;",
-            (token,),
-        ).fetchone()
-        if not t:
-            raise HTTPException(404, "invalid or unknown link")
-        if t["expires_at"] and t["expires_at"] < datetime.now(timezone.utc):
-            raise HTTPException(410, "link expired")
-
-        contact_id = t["contact_id"]
         requirement_id = payload.get("requirement_id")
         storage_path = payload.get("storage_path")
         bytes_ = payload.get("bytes")
@@ -652,37 +712,60 @@ def portal_upload(
         if not requirement_id or not storage_path:
             raise HTTPException(400, "requirement_id and storage_path required")
 
-        exists = db.execute(
-            "select 1 from client_documents where contact_id=%s and requirement_id=%s;",
-            (contact_id, requirement_id),
-        ).fetchone()
-        if not exists:
-            raise HTTPException(404, "document requirement for this contact not found; add it first")
-
-        db.execute(
+        cached = _cached_portal_token(token)
+        if cached:
+            contact_id, expires_at = cached
+            if expires_at and expires_at < datetime.now(timezone.utc):
+                raise HTTPException(410, "link expired")
+            tok_sql = "select c.id as contact_id, %s::timestamptz as expires_at from contacts c where c.id = %s"
+            tok_params = (expires_at, contact_id)
+        else:
+            tok_sql = """
+              select contact_id, expires_at from portal_tokens
+               where token = %s and (expires_at is null or expires_at > now())
             """
-            insert into files(contact_id, requirement_id, storage_bucket, storage_path, bytes, mime_type)
-            values (%s, %s, %s, %s, %s, %s);
-            """,
-            (contact_id, requirement_id, BUCKET, storage_path, bytes_, mime_type),
-        )
-        db.execute(
-            """
-            update client_documents
+            tok_params = (token,)
+
+        # validate token + requirement, record the file, flip the status: one statement
+        done = db.execute(
+            f"""
+            with tok as ({tok_sql}), cd as (
+              select 1 from client_documents d, tok
+               where d.contact_id = tok.contact_id and d.requirement_id = %s
+            ), ins as (
+              insert into files(contact_id, requirement_id, storage_bucket, storage_path, bytes, mime_type)
+              select tok.contact_id, %s, %s, %s, %s, %s from tok
+               where exists (select 1 from cd)
+              returning contact_id
+            )
+            update client_documents d
                set status = 'UPLOADED', uploaded_at = now()
-             where contact_id = %s and requirement_id = %s;
+              from ins
+             where d.contact_id = ins.contact_id and d.requirement_id = %s
+            returning d.contact_id, (select expires_at from tok) as expires_at;
             """,
-            (contact_id, requirement_id),
-        )
+            (*tok_params, requirement_id, requirement_id, BUCKET, storage_path, bytes_, mime_type, requirement_id),
+        ).fetchone()
+
+        if not done:
+            # slow path only on failure: say *why* it was rejected
+            t = db.execute(
+                "select expires_at from portal_tokens where token=%s;",
+                (token,),
+            ).fetchone()
+            if not t:
+                raise HTTPException(404, "invalid or unknown link")
+            if t["expires_at"] and t["expires_at"] < datetime.now(timezone.utc):
+                raise HTTPException(410, "link expired")
+            raise HTTPException(404, "document requirement for this contact not found; add it first")
+
+        contact_id = done["contact_id"]
         db.commit()
+        if not cached:
+            _cache_portal_token(token, contact_id, done["expires_at"])
 
         # Enqueue the thank-you/next-steps follow-up (thread-aware + natural)
-        try:
-            q = get_queue()
-            q.enqueue("app.jobs.on_client_upload", contact_id, requirement_id)
-        except Exception:
-            # non-fatal: upload succeeded
-            pass
+        background.add_task(enqueue_safe, "app.jobs.on_client_upload", contact_id, requirement_id)
 
         return {"ok": True}
     except HTTPException:
@@ -1,72 +1,119 @@
 # backend/app/routes_messages.py
 
-from fastapi import APIRouter, Depends, HTTPException, Body, Query
+from fastapi import APIRouter, Depends, HTTPException, Body, Query, BackgroundTasks
 from psycopg import Connection
 from psycopg.types.json import Json
 from datetime import datetime, timezone, timedelta
-import os, secrets, re
+import os, re, hashlib
+import orjson
 
-from app.deps import get_db
+from app.deps import get_db, get_redis
 from app.decisions import should_autosend
-from app.followups import generate_initial_docs_request, _portal_url as build_portal_url
-from app.queue import get_queue
+from app.followups import generate_initial_docs_request
+from app.queue import get_queue, enqueue_safe
+from app.routes_settings import cached_org_row
+from app.routes_docs import _kickoff_context
 from app.jobs import send_message_and_update
 
 router = APIRouter(prefix="/messages", tags=["messages"])
 
 # Toggle: send inline on approve (bypasses worker). Defaults ON for reliability during demo.
 INLINE_APPROVE_SEND = os.getenv("INLINE_APPROVE_SEND", "1").lower() in ("1","true","yes","on")
+PORTAL_BASE = (os.getenv("PORTAL_BASE") or "http://localhost:3000").rstrip("/")
+
+# Initial-docs drafts for the same matter type + pending labels + sender come
+# out of the LLM nearly identical, so they are generated with placeholders for
+# the contact's first name and portal link, cached in Redis as-is, and filled
+# in per contact.
+# Bump the version whenever the prompt in followups changes.
+DRAFT_TEMPLATE_VERSION = "2"
+DRAFT_CACHE_TTL_SECONDS = 24 * 3600
+_PH_FIRST = "{first_name}"
+_PH_PORTAL = "{portal_url}"
 
 # -----------------------------
 # Helpers
 # -----------------------------
+_ORG_DEFAULTS = {
+    "require_approval_initial": True,
+    "autosend_confidence_threshold": 0.85,
+    "business_hours_tz": "America/Los_Angeles",
+    "business_hours_start": 8,
+    "business_hours_end": 18,
+    "cooldown_hours": 22,
+    "max_daily_sends": 2,
+    "grace_minutes": 5,
+}
+
 def _org_settings(db: Connection) -> dict:
-    row = db.execute("SELECT * FROM org_settings LIMIT 1;").fetchone()
-    if not row:
+    return cached_org_row(db) or dict(_ORG_DEFAULTS)
+
+def _draft_cache_key(c: dict, labels: list[str], org: dict) -> str:
+    first = (c.get("first_name") or "").strip()
+    raw = orjson.dumps([
+        DRAFT_TEMPLATE_VERSION,
+        c.get("matter_type"),
+        sorted(labels),
+        org.get("outbound_from_name"),
+        org.get("outbound_signature"),
+        org.get("include_signature"),
+        bool(first),  # "Hi," vs "Hi <name>," drafts differ in shape
+    ])
+    return "draft:initial:" + hashlib.sha256(raw).hexdigest()
+
+def _generate_initial_cached(db: Connection, c: dict, labels: list[str], portal: str, org: dict) -> dict:
+    """generate_initial_docs_request with a Redis cache in front (LLM output only)."""
+    first = (c.get("first_name") or "").strip()
+
+    def fill(t: str) -> str:
+        return t.replace(_PH_FIRST, first).replace(_PH_PORTAL, portal)
+
+    key = _draft_cache_key(c, labels, org)
+    try:
+        hit = get_redis().get(key)
+    except Exception:
+        hit = None
+    if hit:
+        tpl = orjson.loads(hit)
         return {
-            "require_approval_initial": True,
-            "autosend_confidence_threshold": 0.85,
-            "business_hours_tz": "America/Los_Angeles",
-            "business_hours_start": 8,
-            "business_hours_end": 18,
-            "cooldown_hours": 22,
-            "max_daily_sends": 2,
-            "grace_minutes": 5,
+            "subject": fill(tpl["subject"]),
+            "body": fill(tpl["body"]),
+            "confidence": tpl.get("confidence", 0.98),
+            "intent": "initial_docs_request",
+            "_llm": {"cached": True},
         }
-    return dict(row)
+
+    # Generate with the placeholders themselves as name/link, so the text can
+    # be cached as-is; the name is never searched for in generated text
+    # ("Will you upload..." / "Mark" / a name in the signature).
+    gen = generate_initial_docs_request(
+        db, {**c, "first_name": _PH_FIRST if first else None}, labels, _PH_PORTAL, org
+    )
+    # fallback (non-LLM) drafts are cheap; only cache text that links the portal
+    if gen.get("_llm") and _PH_PORTAL in gen["body"]:
+        tpl = {"subject": gen["subject"], "body": gen["body"], "confidence": gen.get("confidence")}
+        try:
+            get_redis().setex(key, DRAFT_CACHE_TTL_SECONDS, orjson.dumps(tpl))
+        except Exception:
+            pass
+    return {**gen, "subject": fill(gen["subject"]), "body": fill(gen["body"])}
+
 def _draft_initial_docs_request(contact_id: str, db: Connection):
-    # Load contact
-    c = db.execute("SELECT * FROM contacts WHERE id=%s;", (contact_id,)).fetchone()
+    # contact + portal token + pending labels (one round-trip, shared with kickoff)
+    c = _kickoff_context(db, contact_id)
     if not c:
         raise HTTPException(404, "contact not found")
     if c.get("dnc"):
         raise HTTPException(400, "contact is DNC")
-    c = dict(c)
-
-    # Build portal link (creates/extends token)
-    portal = build_portal_url(db, contact_id, None)  # None -> use PORTAL_BASE
-
-    # Required & pending labels
-    rows = db.execute(
-        """
-        SELECT dr.label
-          FROM client_documents cd
-          JOIN document_requirements dr ON dr.id = cd.requirement_id
-         WHERE cd.contact_id = %s
-           AND COALESCE(cd.is_required, dr.is_required) = TRUE
-           AND cd.status = 'PENDING'
-         ORDER BY dr.label;
-        """,
-        (contact_id,),
-    ).fetchall()
-    labels = [r["label"] for r in rows]
 
-    # Org settings (for tone/signature, etc.)
-    org = _org_settings(db)
+    portal = f"{PORTAL_BASE}/portal/{c.pop('token')}"
+    labels = list(c.pop("labels") or [])
+    c.pop("pmid", None)  # kickoff's reply threading; not used by drafts
+    org = _org_settings(db)  # cached; usually no round-trip
 
     # ✨ AI-generate the draft
-    gen = generate_initial_docs_request(db, c, labels, portal, org)
-    body = _finalize_body(db, gen["body"])  # keep your signature logic
+    gen = _generate_initial_cached(db, c, labels, portal, org)
+    body = _finalize_body(gen["body"], org)  # keep your signature logic
     subject = gen["subject"]
 
     drafted_meta = {
@@ -77,77 +124,46 @@ def _draft_initial_docs_request(contact_id: str, db: Connection):
         "_llm": gen.get("_llm"),
     }
 
-    draft_row = db.execute(
-        "INSERT INTO messages(contact_id, channel, direction, body, meta) "
-        "VALUES (%s,'EMAIL','DRAFT',%s,%s) RETURNING id;",
-        (contact_id, body, Json(drafted_meta)),
-    ).fetchone()
-    draft_id = str(draft_row["id"])
-
-    db.execute(
-        "INSERT INTO timeline(contact_id,type,detail) "
-        "VALUES(%s,'NOTE','Drafted initial docs request (AI)');",
-        (contact_id,),
-    )
-    db.commit()
+    # insert + COMMIT go out in a single pipeline flush
+    with db.pipeline():
+        cur = db.execute(
+            """
+            WITH draft AS (
+              INSERT INTO messages(contact_id, channel, direction, body, meta)
+              VALUES (%s,'EMAIL','DRAFT',%s,%s)
+              RETURNING id, contact_id
+            ), note AS (
+              INSERT INTO timeline(contact_id,type,detail)
+              SELECT contact_id,'NOTE','Drafted initial docs request (AI)' FROM draft
+            )
+            SELECT id FROM draft;
+            """,
+            (contact_id, body, Json(drafted_meta)),
+        )
+        db.commit()
+    draft_id = str(cur.fetchone()["id"])
 
-    return {"ok": True, "draft_id": draft_id, "auto_enqueued": False}
+    # "contact" is for in-process callers (draft_initial); routes drop it
+    return {"ok": True, "draft_id": draft_id, "auto_enqueued": False, "contact": c}
 
-def _signature_block(db: Connection) -> str:
-    row = db.execute("""
-      SELECT COALESCE(include_signature, true) AS include_signature,
-             outbound_from_name,
-             outbound_signature
-      FROM org_settings LIMIT 1;
-    """).fetchone() or {}
-    if not row or not row["include_signature"]:
+def _signature_block(org: dict) -> str:
+    if org.get("include_signature") is False:
         return ""
-    name = (row.get("outbound_from_name") or "").strip()
-    sig  = (row.get("outbound_signature") or "").strip()
+    name = (org.get("outbound_from_name") or "").strip()
+    sig  = (org.get("outbound_signature") or "").strip()
     parts = [p for p in [name, sig] if p]
     return "\n".join(parts)
 
-def _finalize_body(db: Connection, body: str) -> str:
+def _finalize_body(body: str, org: dict) -> str:
     body = re.sub(r"\[[^\]]+\]", "", body).strip()
-    sig = _signature_block(db)
+    sig = _signature_block(org)
     return f"{body}\n\n{sig}".strip() if sig else body
 
-def _portal_url(db: Connection, contact_id: str, base: str) -> str:
-    tok = db.execute(
-        "SELECT token FROM portal_tokens WHERE contact_id=%s AND (expires_at IS NULL OR expires_at>now()) LIMIT 1",
-        (contact_id,),
-    ).fetchone()
-    if tok:
-        token = tok["token"]
-    else:
-        token = secrets.token_urlsafe(24)
-        exp = datetime.now(timezone.utc) + timedelta(days=30)
-        db.execute(
-            "INSERT INTO portal_tokens(token, contact_id, expires_at) VALUES (%s,%s,%s)",
-            (token, contact_id, exp),
-        )
-    return f"{base.rstrip('/')}/portal/{token}"
-
-def _missing_labels(db: Connection, contact_id: str) -> list[str]:
-    rows = db.execute(
-        """
-        SELECT dr.label
-          FROM client_documents cd
-          JOIN document_requirements dr ON dr.id = cd.requirement_id
-         WHERE cd.contact_id = %s
-           AND COALESCE(cd.is_required, dr.is_required) = TRUE
-           AND cd.status = 'PENDING'
-         ORDER BY dr.label;
-        """,
-        (contact_id,),
-    ).fetchall()
-    return [r["label"] for r in rows]
-
 def _contact(db: Connection, contact_id: str):
     row = db.execute("SELECT * FROM contacts WHERE id = %s;", (contact_id,)).fetchone()
     if not row:
         raise HTTPException(404, "contact not found")
-    return dict(row)
+    return row  # dict_row: already a dict
 
 # -----------------------------
 # Thread loaders
@@ -199,7 +215,7 @@ def thread_by_message(
             raise HTTPException(404, detail=f"fallback_contact_id does not exist: {fallback_contact_id}")
         db.execute("UPDATE messages SET contact_id = %s WHERE id = %s;", (fallback_contact_id, message_id))
         db.commit()
-        contact = dict(c2)
+        contact = c2
         contact_id = c2["id"]
     else:
         contact = {
@@ -229,18 +245,23 @@ def thread_by_message(
 
 @router.post("/draft-initial-docs/{contact_id}")
 def draft_initial_docs_route(contact_id: str, db: Connection = Depends(get_db)):
-    return _draft_initial_docs_request(contact_id, db)
+    created = _draft_initial_docs_request(contact_id, db)
+    created.pop("contact", None)
+    return created
 
 @router.post("/draft-initial/{contact_id}")
-def draft_initial(contact_id: str, payload: dict = Body(default={}), db: Connection = Depends(get_db)):
+def draft_initial(
+    contact_id: str,
+    background: BackgroundTasks,
+    payload: dict = Body(default={}),
+    db: Connection = Depends(get_db),
+):
     # Reuse the AI helper to create the draft
     created = _draft_initial_docs_request(contact_id, db)
     draft_id = created["draft_id"]
 
-    # Auto-send decision for *initial* messages
-    c = db.execute("SELECT dnc, last_sent_at, sends_today FROM contacts WHERE id=%s;", (contact_id,)).fetchone()
-    if not c:
-        raise HTTPException(404, "contact not found")
+    # Auto-send decision for *initial* messages (contact row loaded by the helper)
+    c = created["contact"]
     org = _org_settings(db)
 
     allowed, decision_meta, when = should_autosend(
@@ -267,28 +288,28 @@ def draft_initial(contact_id: str, payload: dict = Body(default={}), db: Connect
         }
     )
 
-    db.execute(
-        "INSERT INTO timeline(contact_id,type,detail) VALUES (%s,'AUTO_SEND_DECISION',%s);",
-        (contact_id, Json({"message_id": draft_id, **(decision_meta or {})})),
-    )
-    db.commit()
+    with db.pipeline():
+        db.execute(
+            "INSERT INTO timeline(contact_id,type,detail) VALUES (%s,'AUTO_SEND_DECISION',%s);",
+            (contact_id, Json({"message_id": draft_id, **(decision_meta or {})})),
+        )
+        db.commit()
 
     if not allowed:
         return {"ok": True, "draft_id": draft_id, "auto_enqueued": False}
 
-    # enqueue or schedule
-    q = get_queue()
+    # schedule, or enqueue after the response goes out
     now_utc = datetime.now(timezone.utc)
     if when and when > now_utc:
         try:
-            from rq.scheduler import Scheduler
-            scheduler = Scheduler("outbound", connection=q.connection)
-            scheduler.enqueue_at(when, "app.jobs.send_message_and_update", draft_id, "EMAIL")
+            get_queue().enqueue_at(when, "app.jobs.send_message_and_update", draft_id, "EMAIL")
             return {"ok": True, "draft_id": draft_id, "auto_enqueued": True, "scheduled_for": when.isoformat()}
-        except Exception:
-            pass
+        except Exception as e:
+            # don't send now instead: "when" is outside business hours/cooldown
+            print(f"[queue] FAILED to schedule draft {draft_id}: {e}")
+            return {"ok": True, "draft_id": draft_id, "auto_enqueued": False}
 
-    q.enqueue("app.jobs.send_message_and_update", draft_id, "EMAIL")
+    background.add_task(enqueue_safe, "app.jobs.send_message_and_update", draft_id, "EMAIL")
     return {"ok": True, "draft_id": draft_id, "auto_enqueued": True}
 # -----------------------------
 # Draft update (edit/save)
@@ -318,16 +339,46 @@ def update_draft_post(message_id: str, payload: dict = Body(...), db: Connection
 # -----------------------------
 # Approve & send (inline by default)
 # -----------------------------
+def _send_approved(message_id, channel: str):
+    """
+    BackgroundTask for approve_and_send: prefer worker enqueue; if that
+    fails, send+finalize inline so the draft still flips.
+    """
+    try:
+        get_queue().enqueue("app.jobs.send_message_and_update", message_id, channel)
+        return
+    except Exception as e_enqueue:
+        err = e_enqueue
+    try:
+        from app.jobs import send_message_and_update as _inline_send
+        _inline_send(message_id, channel)
+    except Exception as e_inline:
+        # log both errors so you can see *why* it failed
+        print(f"[approve] Queue failed: {err!r} | Inline send failed: {e_inline!r}")
+
 @router.post("/approve/{message_id}")
-def approve_and_send(message_id: str, db: Connection = Depends(get_db)):
+def approve_and_send(message_id: str, background: BackgroundTasks, db: Connection = Depends(get_db)):
     """
-    Approve a DRAFT; prefer worker enqueue.
-    If enqueue fails, do an inline send+finalize so the draft still flips.
+    Approve a DRAFT; the send is handed to the worker after the response
+    (inline fallback if enqueue fails, see _send_approved).
     """
-    row = db.execute(
-        "SELECT id, contact_id, channel, direction FROM messages WHERE id=%s;",
-        (message_id,)
-    ).fetchone()
+    # load the message and, if it's still a draft, add the timeline note;
+    # statement + COMMIT share one round-trip (a no-op commit if not a draft)
+    with db.pipeline():
+        cur = db.execute(
+            """
+            WITH m AS (
+              SELECT id, contact_id, channel, direction FROM messages WHERE id=%s
+            ), note AS (
+              INSERT INTO timeline(contact_id, type, detail)
+              SELECT contact_id,'NOTE','Draft approved by user' FROM m WHERE direction = 'DRAFT'
+            )
+            SELECT * FROM m;
+            """,
+            (message_id,)
+        )
+        db.commit()
+    row = cur.fetchone()
     if not row:
         raise HTTPException(status_code=404, detail="message not found")
 
@@ -335,30 +386,8 @@ def approve_and_send(message_id: str, db: Connection = Depends(get_db)):
         # Already flipped by worker or previous action
         return {"ok": True, "already_sent": True}
 
-    # timeline note
-    db.execute(
-        "INSERT INTO timeline(contact_id, type, detail) VALUES (%s,'NOTE','Draft approved by user');",
-        (row["contact_id"],)
-    )
-    db.commit()
-
-    # Try to enqueue
-    try:
-        q = get_queue()
-        q.enqueue("app.jobs.send_message_and_update", row["id"], row["channel"])
-        return {"ok": True, "queued": True}
-    except Exception as e_enqueue:
-        # Inline fallback: call the same worker function synchronously
-        try:
-            from app.jobs import send_message_and_update as _inline_send
-            result = _inline_send(row["id"], row["channel"])
-            return {"ok": True, "queued": False, "result": result}
-        except Exception as e_inline:
-            # Show both errors in detail so you can see *why* it failed
-            raise HTTPException(
-                status_code=500,
-                detail=f"Queue failed: {repr(e_enqueue)} | Inline send failed: {repr(e_inline)}"
-            )
+    background.add_task(_send_approved, row["id"], row["channel"])
+    return {"ok": True, "queued": True}
 # -----------------------------
 # (Optional) Scheduler helpers
 # -----------------------------
@@ -1,8 +1,12 @@
 # backend/app/routes_settings.py
+import os
+import threading
+import time
+import psycopg
 from fastapi import APIRouter, Depends, HTTPException, Body
 from psycopg import Connection
 from psycopg.types.json import Json
-from app.deps import get_db
+from app.deps import get_db, DATABASE_URL
 from app.models import OrgSettingsOut, OrgSettingsUpdate
 
 router = APIRouter(prefix="/org", tags=["org"])
@@ -26,12 +30,76 @@ EXTRA_FIELDS = [
 
 ALL_FIELDS = BASE_FIELDS + EXTRA_FIELDS
 
+# org_settings is a singleton that changes a few times a day; every draft,
+# kickoff and settings read shares this copy. update_settings NOTIFYs and
+# every process LISTENing drops its copy, so the TTL is only a backstop:
+# short while the listener is down, long while it's connected.
+ORG_SETTINGS_TTL_SECONDS = 30
+ORG_SETTINGS_LISTEN_TTL_SECONDS = 3600
+ORG_SETTINGS_CHANNEL = "org_settings_changed"
+# LISTEN needs a session-level connection: point this past PgBouncer's
+# transaction pooling when DATABASE_URL goes through it.
+DATABASE_LISTEN_URL = os.getenv("DATABASE_LISTEN_URL") or DATABASE_URL
+
+_org_cache: tuple[float, dict | None] | None = None  # (fetched_at, row or None)
+# Bumped by every invalidation. A read only stores its row if no invalidation
+# happened since it started, so a SELECT that raced an update can't put the
+# old row back for the whole TTL.
+_org_gen = 0
+_org_lock = threading.Lock()
+_org_listening = False
+_org_listener: threading.Thread | None = None
+
+def cached_org_row(db: Connection) -> dict | None:
+    """The org_settings row as a fresh dict (None if there is no row)."""
+    global _org_cache
+    now = time.monotonic()
+    hit = _org_cache
+    ttl = ORG_SETTINGS_LISTEN_TTL_SECONDS if _org_listening else ORG_SETTINGS_TTL_SECONDS
+    if not hit or now - hit[0] >= ttl:
+        gen = _org_gen
+        row = db.execute("SELECT * FROM org_settings LIMIT 1;").fetchone()
+        hit = (now, row)  # dict_row, or None
+        with _org_lock:
+            if gen == _org_gen:
+                _org_cache = hit
+    return dict(hit[1]) if hit[1] is not None else None
+
+def invalidate_org_cache():
+    global _org_cache, _org_gen
+    with _org_lock:
+        _org_gen += 1
+        _org_cache = None
+
+def _listen_for_org_changes():
+    global _org_listening
+    while True:
+        try:
+            with psycopg.connect(DATABASE_LISTEN_URL, autocommit=True) as conn:
+                conn.execute(f"LISTEN {ORG_SETTINGS_CHANNEL};")
+                _org_listening = True
+                invalidate_org_cache()  # may have missed a NOTIFY while disconnected
+                for _ in conn.notifies():
+                    invalidate_org_cache()
+        except Exception as e:
+            print(f"[org] settings listener disconnected: {e}")
+        _org_listening = False
+        time.sleep(5)
+
+def start_org_listener():
+    """Start the LISTEN thread once per process (called from app startup)."""
+    global _org_listener
+    if _org_listener is None:
+        _org_listener = threading.Thread(
+            target=_listen_for_org_changes, name="org-settings-listener", daemon=True
+        )
+        _org_listener.start()
+
 @router.get("/settings")
 def get_settings(db: Connection = Depends(get_db)):
-    row = db.execute("SELECT * FROM org_settings LIMIT 1;").fetchone()
-    if not row:
+    out = cached_org_row(db)
+    if not out:
         raise HTTPException(500, "org_settings row not found")
-    out = dict(row)
     # cast floats explicitly
     if "autosend_confidence_threshold" in out and out["autosend_confidence_threshold"] is not None:
         out["autosend_confidence_threshold"] = float(out["autosend_confidence_threshold"])
@@ -47,12 +115,13 @@ def update_settings(payload: dict = Body(...), db: Connection = Depends(get_db))
 
     if sets:
         db.execute(f"UPDATE org_settings SET {', '.join(sets)};", tuple(vals))
+        db.execute(f"NOTIFY {ORG_SETTINGS_CHANNEL};")  # delivered on commit
         db.commit()
+        invalidate_org_cache()
 
-    row = db.execute("SELECT * FROM org_settings LIMIT 1;").fetchone()
-    if not row:
+    out = cached_org_row(db)
+    if not out:
         raise HTTPException(500, "org_settings row not found")
-    out = dict(row)
     if "autosend_confidence_threshold" in out and out["autosend_confidence_threshold"] is not None:
         out["autosend_confidence_threshold"] = float(out["autosend_confidence_threshold"])
     return {k: out.get(k) for k in ALL_FIELDS}
@@ -1,10 +1,11 @@
 # backend/app/routes_webhooks.py
-from fastapi import APIRouter, Request, HTTPException, Depends, Form
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Request, HTTPException, Depends, Form, BackgroundTasks
+from fastapi.responses import ORJSONResponse
+from fastapi.concurrency import run_in_threadpool
 from psycopg import Connection
 from psycopg.types.json import Json
 from app.deps import get_db
-from app.queue import get_queue
+from app.queue import enqueue_safe
 
 from urllib.parse import parse_qs
 from email.parser import BytesParser
@@ -17,7 +18,14 @@ import hashlib
 import base64
 import html as htmllib
 import json as pyjson
-from uuid import UUID
+
+try:
+    # C-backed HTML parser: one tree walk instead of five regex passes
+    from selectolax.lexbor import LexborHTMLParser as _HTMLParser
+    _SELECTOLAX_OK = True
+except Exception:
+    _HTMLParser = None  # type: ignore
+    _SELECTOLAX_OK = False
 
 router = APIRouter(prefix="/webhooks", tags=["webhooks"])
 
@@ -26,19 +34,53 @@ router = APIRouter(prefix="/webhooks", tags=["webhooks"])
 # -------------------------------------------------
 REPLIES_PREFIX = os.getenv("REPLIES_PREFIX", "r")   # e.g. "r"
 REPLIES_DOMAIN = os.getenv("REPLIES_DOMAIN")        # optional (not strictly required to parse)
+_TWILIO_TOKEN = (os.getenv("TWILIO_AUTH_TOKEN") or "").encode("utf-8")  # empty = skip verification
+
+# Compiled once; these run on every inbound SMS/email
+_RE_SCRIPT_STYLE = re.compile(r"<(script|style).*?>.*?(</\1>)", re.I | re.S)
+_RE_BR = re.compile(r"<br\s*/?>", re.I)
+_RE_P_CLOSE = re.compile(r"</p\s*>", re.I)
+_RE_LI = re.compile(r"<li\s*>", re.I)
+_RE_TAG = re.compile(r"<[^>]+>", re.S)
+_RE_ADDR = re.compile(r"[\w\.\+\-]+@[\w\.\-]+")
+_RE_DIGITS = re.compile(r"\D")
+_UUID_RE = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$", re.I)
 
 # -------------------------------------------------
 # Helpers
 # -------------------------------------------------
 def _html_to_text(s: str) -> str:
-    """Very light HTML → text conversion suitable for email bodies."""
+    """HTML → text for email bodies; regex fallback if selectolax is missing or chokes."""
     if not s:
         return ""
-    s = re.sub(r"(?is)<(script|style).*?>.*?(</\1>)", "", s)
-    s = re.sub(r"(?is)<br\s*/?>", "\n", s)
-    s = re.sub(r"(?is)</p\s*>", "\n\n", s)
-    s = re.sub(r"(?is)<li\s*>", "- ", s)
-    s = re.sub(r"(?is)<[^>]+>", "", s)
+    if _SELECTOLAX_OK:
+        try:
+            tree = _HTMLParser(s)
+            tree.strip_tags(["script", "style"])
+            # line breaks only at block boundaries; a text() separator would also
+            # split inline markup ("Hello <b>world</b>" -> "Hello \nworld")
+            for br in tree.css("br"):
+                br.replace_with("\n")
+            for p in tree.css("p"):
+                p.insert_after("\n\n")
+            for el in tree.css("div, li"):
+                el.insert_after("\n")
+            for li in tree.css("li"):
+                li.insert_before("- ")
+            node = tree.body or tree.root
+            if node is not None:
+                return node.text(separator="").strip()
+        except Exception:
+            pass
+    return _html_to_text_re(s)
+
+def _html_to_text_re(s: str) -> str:
+    """Very light regex HTML → text conversion."""
+    s = _RE_SCRIPT_STYLE.sub("", s)
+    s = _RE_BR.sub("\n", s)
+    s = _RE_P_CLOSE.sub("\n\n", s)
+    s = _RE_LI.sub("- ", s)
+    s = _RE_TAG.sub("", s)
     return htmllib.unescape(s).strip()
 
 def _extract_contact_id(to_field: str) -> str | None:
@@ -48,26 +90,24 @@ def _extract_contact_id(to_field: str) -> str | None:
     """
     if not to_field:
         return None
-    for addr in re.findall(r"[\w\.\+\-]+@[\w\.\-]+", to_field):
-        local, _, _domain = addr.partition("@")
-        if "+" not in local:
+    tag = REPLIES_PREFIX + "+"
+    for m in _RE_ADDR.finditer(to_field):
+        # check the prefix in place; only slice out a candidate when it matches
+        start = m.start()
+        if not to_field.startswith(tag, start):
             continue
-        prefix, _, suffix = local.partition("+")
-        if prefix != REPLIES_PREFIX:
-            continue
-        cid = suffix[:36]  # take first 36 chars after '+'
-        try:
-            UUID(cid)
+        begin = start + len(tag)
+        at = to_field.index("@", begin, m.end())
+        cid = to_field[begin:min(begin + 36, at)]  # first 36 chars after '+'
+        if _UUID_RE.match(cid):
             return cid
-        except Exception:
-            continue
     return None
 
 def norm_phone(p: str | None) -> str | None:
     """Normalize US numbers to +1XXXXXXXXXX where possible."""
     if not p:
         return None
-    digits = re.sub(r"\D", "", p)
+    digits = _RE_DIGITS.sub("", p)
     if len(digits) == 10:
         return "+1" + digits
     if len(digits) == 11 and digits.startswith("1"):
@@ -81,14 +121,14 @@ def verify_twilio_signature(request: Request, body_bytes: bytes) -> bool:
     Optional: verify X-Twilio-Signature. For local dev, skip if token missing.
     (For production, prefer Twilio's official RequestValidator.)
     """
-    token = os.getenv("TWILIO_AUTH_TOKEN")
     sig = request.headers.get("X-Twilio-Signature")
-    if not token or not sig:
+    if not _TWILIO_TOKEN or not sig:
         return True
-    url = str(request.url)
-    mac = hmac.new(token.encode("utf-8"), msg=(url.encode("utf-8") + body_bytes), digestmod=hashlib.sha1)
-    expected = base64.b64encode(mac.digest()).decode("utf-8")
-    return hmac.compare_digest(expected, sig)
+    mac = hmac.new(_TWILIO_TOKEN, digestmod=hashlib.sha1)
+    mac.update(str(request.url).encode("utf-8"))
+    mac.update(body_bytes)
+    expected = base64.b64encode(mac.digest())
+    return hmac.compare_digest(expected, sig.encode("utf-8"))
 
 def _extract_plain_text_from_form(form) -> str | None:
     """
@@ -134,38 +174,20 @@ def _extract_plain_text_from_form(form) -> str | None:
     if raw is not None:
         try:
             if hasattr(raw, "read"):
-                raw_bytes = raw.file.read()
-            elif isinstance(raw, bytes):
-                raw_bytes = raw
+                # UploadFile: parse straight from the spooled file, no extra copy
+                raw.file.seek(0)
+                msg = BytesParser(policy=email_default).parse(raw.file)
             else:
-                raw_bytes = str(raw).encode()
-            msg = BytesParser(policy=email_default).parsebytes(raw_bytes)
-            if msg.is_multipart():
-                # prefer text/plain part
-                for part in msg.walk():
-                    ctype = part.get_content_type().lower()
-                    if ctype == "text/plain":
-                        txt = part.get_content() or ""
-                        if txt.strip():
-                            return txt.strip()
-                # fallback to text/html
-                for part in msg.walk():
-                    ctype = part.get_content_type().lower()
-                    if ctype == "text/html":
-                        html_txt = part.get_content() or ""
-                        html_txt = _html_to_text(html_txt)
-                        if html_txt.strip():
-                            return html_txt.strip()
-            else:
-                ctype = msg.get_content_type().lower()
-                if ctype == "text/plain":
-                    txt = msg.get_content() or ""
-                    if txt.strip():
-                        return txt.strip()
-                if ctype == "text/html":
-                    html_txt = _html_to_text(msg.get_content() or "")
-                    if html_txt.strip():
-                        return html_txt.strip()
+                raw_bytes = raw if isinstance(raw, bytes) else str(raw).encode()
+                msg = BytesParser(policy=email_default).parsebytes(raw_bytes)
+            # best body part in one pass: text/plain, else text/html
+            part = msg.get_body(preferencelist=("plain", "html"))
+            if part is not None:
+                txt = part.get_content() or ""
+                if part.get_content_type() == "text/html":
+                    txt = _html_to_text(txt)
+                if txt.strip():
+                    return txt.strip()
         except Exception:
             pass
 
@@ -174,10 +196,16 @@ def _extract_plain_text_from_form(form) -> str | None:
 # -------------------------------------------------
 # Twilio SMS inbound
 # -------------------------------------------------
+# The async endpoints below only await the request body; the parsing and
+# psycopg work runs in a plain def on the threadpool so it never blocks the
+# event loop.
 @router.post("/twilio/sms")
 async def twilio_sms(request: Request, db: Connection = Depends(get_db)):
+    raw_bytes = await request.body()
+    return await run_in_threadpool(_handle_twilio_sms, request, raw_bytes, db)
+
+def _handle_twilio_sms(request: Request, raw_bytes: bytes, db: Connection):
     try:
-        raw_bytes = await request.body()
         raw_text = raw_bytes.decode("utf-8", errors="replace")
         form = parse_qs(raw_text, keep_blank_values=True)
 
@@ -202,27 +230,34 @@ async def twilio_sms(request: Request, db: Connection = Depends(get_db)):
         if not from_phone:
             raise HTTPException(status_code=400, detail=f"invalid From phone: {raw_from}")
 
-        row = db.execute("SELECT id FROM contacts WHERE phone = %s LIMIT 1;", (from_phone,)).fetchone()
-        if row:
-            contact_id = row["id"]
-        else:
-            contact_id = db.execute(
-                "INSERT INTO contacts (first_name,last_name,email,phone,status) VALUES ('','',NULL,%s,'NEW') RETURNING id;",
-                (from_phone,)
-            ).fetchone()["id"]
-            db.execute(
-                "INSERT INTO timeline (contact_id,type,detail) VALUES (%s,'NOTE','Contact auto-created from inbound SMS');",
-                (contact_id,)
+        # find-or-create contact, message, timeline: one statement
+        contact_id = db.execute(
+            """
+            WITH found AS (
+              SELECT id FROM contacts WHERE phone = %s LIMIT 1
+            ), created AS (
+              INSERT INTO contacts (first_name,last_name,email,phone,status)
+              SELECT '','',NULL,%s,'NEW' WHERE NOT EXISTS (SELECT 1 FROM found)
+              RETURNING id
+            ), contact AS (
+              SELECT id FROM found UNION ALL SELECT id FROM created
+            ), note AS (
+              INSERT INTO timeline (contact_id,type,detail)
+              SELECT id,'NOTE','Contact auto-created from inbound SMS' FROM created
+              RETURNING id
+            ), msg AS (
+              INSERT INTO messages (contact_id, channel, direction, body, meta)
+              SELECT id,'SMS','INBOUND',%s,%s FROM contact
+              RETURNING contact_id
             )
-
-        db.execute(
-            "INSERT INTO messages (contact_id, channel, direction, body, meta) VALUES (%s,'SMS','INBOUND',%s,%s);",
-            (contact_id, text, Json({"from": from_phone, "to": to_phone}))
-        )
-        db.execute(
-            "INSERT INTO timeline (contact_id,type,detail) VALUES (%s,'INBOUND','SMS received');",
-            (contact_id,)
-        )
+            -- joining note's RETURNING makes the NOTE row (if any) go in
+            -- first, so it keeps the lower id under the shared now()
+            INSERT INTO timeline (contact_id,type,detail)
+            SELECT msg.contact_id,'INBOUND','SMS received' FROM msg LEFT JOIN note ON true
+            RETURNING contact_id;
+            """,
+            (from_phone, from_phone, text, Json({"from": from_phone, "to": to_phone}))
+        ).fetchone()["contact_id"]
         db.commit()
 
         return {"ok": True, "contact_id": contact_id}
@@ -235,43 +270,39 @@ async def twilio_sms(request: Request, db: Connection = Depends(get_db)):
 # Dev-only email simulator (handy for quick tests)
 # -------------------------------------------------
 @router.post("/dev/email")
-async def dev_email(
+def dev_email(
     db: Connection = Depends(get_db),
     to_email: str = Form(...),
     from_email: str = Form(...),
     body: str = Form("")
 ):
-    row = db.execute(
-        "SELECT id FROM contacts WHERE email = %s LIMIT 1;", (from_email,)
-    ).fetchone()
-
-    if row:
-        contact_id = row["id"]
-    else:
-        contact_id = db.execute(
-            """
-            INSERT INTO contacts (first_name, last_name, email, phone, status)
-            VALUES ('', '', %s, NULL, 'NEW')
-            RETURNING id;
-            """,
-            (from_email,)
-        ).fetchone()["id"]
-        db.execute(
-            "INSERT INTO timeline (contact_id, type, detail) VALUES (%s,'NOTE','Contact auto-created from inbound email (DEV)');",
-            (contact_id,)
-        )
-
-    db.execute(
+    # find-or-create contact, message, timeline: one statement
+    contact_id = db.execute(
         """
-        INSERT INTO messages (contact_id, channel, direction, body, meta)
-        VALUES (%s, 'EMAIL', 'INBOUND', %s, %s);
+        WITH found AS (
+          SELECT id FROM contacts WHERE email = %s LIMIT 1
+        ), created AS (
+          INSERT INTO contacts (first_name, last_name, email, phone, status)
+          SELECT '', '', %s, NULL, 'NEW' WHERE NOT EXISTS (SELECT 1 FROM found)
+          RETURNING id
+        ), contact AS (
+          SELECT id FROM found UNION ALL SELECT id FROM created
+        ), note AS (
+          INSERT INTO timeline (contact_id, type, detail)
+          SELECT id, 'NOTE', 'Contact auto-created from inbound email (DEV)' FROM created
+          RETURNING id
+        ), msg AS (
+          INSERT INTO messages (contact_id, channel, direction, body, meta)
+          SELECT id, 'EMAIL', 'INBOUND', %s, %s FROM contact
+          RETURNING contact_id
+        )
+        -- NOTE first (see twilio_sms)
+        INSERT INTO timeline (contact_id, type, detail)
+        SELECT msg.contact_id, 'INBOUND', 'Email received (DEV)' FROM msg LEFT JOIN note ON true
+        RETURNING contact_id;
         """,
-        (contact_id, body.strip(), Json({"from": from_email, "to": to_email}))
-    )
-    db.execute(
-        "INSERT INTO timeline (contact_id, type, detail) VALUES (%s,'INBOUND','Email received (DEV)');",
-        (contact_id,)
-    )
+        (from_email, from_email, body.strip(), Json({"from": from_email, "to": to_email}))
+    ).fetchone()["contact_id"]
     db.commit()
     return {"ok": True, "contact_id": contact_id}
 
@@ -279,10 +310,16 @@ async def dev_email(
 # SendGrid Inbound Parse webhook (robust body extraction)
 # -------------------------------------------------
 @router.post("/sendgrid/inbound")
-async def sendgrid_inbound(request: Request, db: Connection = Depends(get_db)):
+async def sendgrid_inbound(
+    request: Request,
+    background: BackgroundTasks,
+    db: Connection = Depends(get_db),
+):
     # Starlette parses multipart into FormData with strings and/or UploadFile objects
     form = await request.form()
+    return await run_in_threadpool(_handle_sendgrid_inbound, form, background, db)
 
+def _handle_sendgrid_inbound(form, background: BackgroundTasks, db: Connection):
     to_raw       = (form.get("to") or "").strip()
     from_raw     = (form.get("from") or "").strip()
     subject      = (form.get("subject") or "").strip()
@@ -301,17 +338,23 @@ async def sendgrid_inbound(request: Request, db: Connection = Depends(get_db)):
             pass
 
     if not contact_id:
-        return JSONResponse({"detail": "no contact matched to="}, status_code=404)
+        return ORJSONResponse({"detail": "no contact matched to="}, status_code=404)
 
     # Extract body text from any available field
     body_text = _extract_plain_text_from_form(form) or "[no content in message body]"
 
-    # Insert inbound
+    # Insert inbound message + timeline entry in one statement
     row = db.execute(
         """
-        INSERT INTO messages(contact_id, channel, direction, body, meta)
-        VALUES (%s,'EMAIL','INBOUND',%s,%s)
-        RETURNING id;
+        WITH msg AS (
+          INSERT INTO messages(contact_id, channel, direction, body, meta)
+          VALUES (%s,'EMAIL','INBOUND',%s,%s)
+          RETURNING id, contact_id
+        ), tl AS (
+          INSERT INTO timeline(contact_id,type,detail)
+          SELECT contact_id,'INBOUND','Email received via SendGrid' FROM msg
+        )
+        SELECT id FROM msg;
         """,
         (
             contact_id,
@@ -329,24 +372,9 @@ async def sendgrid_inbound(request: Request, db: Connection = Depends(get_db)):
             })
         ),
     ).fetchone()
-
-    db.execute(
-        "INSERT INTO timeline(contact_id,type,detail) VALUES (%s,'INBOUND','Email received via SendGrid');",
-        (contact_id,),
-    )
     db.commit()
 
-   # Kick off auto-reply/labeling worker (enqueue the callable directly)
-    try:
-        from app.jobs import react_to_inbound  # local import to avoid cycles at import time
-        q = get_queue()
-        job = q.enqueue(react_to_inbound, str(row["id"]))
-        print(f"[webhooks] enqueued react_to_inbound job_id={job.id} for message {row['id']}")
-        queued = True
-        job_id = job.id
-    except Exception as e:
-        print(f"[webhooks] FAILED to enqueue react_to_inbound for message {row['id']}: {e}")
-        queued = False
-        job_id = None
+    # Kick off auto-reply/labeling worker once SendGrid has its 200
+    background.add_task(enqueue_safe, "app.jobs.react_to_inbound", str(row["id"]))
 
-    return {"ok": True, "message_id": str(row["id"]), "queued": queued, "job_id": job_id}
+    return {"ok": True, "message_id": str(row["id"]), "queued": True}
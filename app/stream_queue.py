@@ -0,0 +1,134 @@
+# backend/app/stream_queue.py
+#
+# Fire-and-forget sends go through a Redis Stream instead of RQ:
+# one XADD per enqueue, consumed by a worker group with XREADGROUP.
+# Run a consumer with:  python -m app.stream_queue
+#
+# The consumer is asyncio: up to STREAM_CONCURRENCY sends (plain sync
+# SendGrid/Twilio calls, run on a thread pool) are in flight while the next
+# XREADGROUP is already waiting, so Redis round-trips overlap provider I/O.
+import os
+import socket
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import orjson
+from redis import from_url
+from redis.asyncio import from_url as async_from_url
+from redis.exceptions import ResponseError
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+STREAM = "outbound"
+GROUP = "workers"
+MAXLEN = 100_000     # approximate trim; keeps the stream bounded
+BATCH = 64           # entries pulled per XREADGROUP round-trip
+BLOCK_MS = 5000
+CONCURRENCY = int(os.getenv("STREAM_CONCURRENCY", "16"))  # sends in flight per consumer
+CLAIM_IDLE_MS = 60_000  # pending this long = its consumer died; take it over on startup
+
+_redis = None
+
+def _redis_url() -> str:
+    raw = os.getenv("REDIS_URL") or ""
+    url = "".join(raw.split())
+    if not url:
+        raise RuntimeError("REDIS_URL is not set")
+    return url
+
+def _conn():
+    global _redis
+    if _redis is None:
+        _redis = from_url(_redis_url())
+    return _redis
+
+def xadd_send(kind: str, payload: dict) -> str:
+    """Append one send to the stream. Returns the stream entry id."""
+    entry_id = _conn().xadd(
+        STREAM,
+        {"kind": kind, "data": orjson.dumps(payload)},
+        maxlen=MAXLEN,
+        approximate=True,
+    )
+    return entry_id.decode() if isinstance(entry_id, bytes) else entry_id
+
+def _handlers() -> dict:
+    from app.jobs import send_email, send_sms
+    return {"email": send_email, "sms": send_sms}
+
+async def consume(consumer: str, concurrency: int = CONCURRENCY):
+    r = async_from_url(_redis_url())
+    try:
+        await r.xgroup_create(STREAM, GROUP, id="0", mkstream=True)
+    except ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+    handlers = _handlers()
+    loop = asyncio.get_running_loop()
+    pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="stream-send")
+    slots = asyncio.Semaphore(concurrency)
+    inflight: set[asyncio.Task] = set()
+
+    async def run(entry_id, fields):
+        kind = fields.get(b"kind", b"").decode()
+        try:
+            try:
+                call = partial(handlers[kind], **orjson.loads(fields[b"data"]))
+                await loop.run_in_executor(pool, call)
+            except Exception as e:
+                # same as a failed RQ job: log it and move on
+                print(f"[stream] {kind} entry {entry_id!r} failed: {e}")
+            try:
+                await r.xack(STREAM, GROUP, entry_id)
+            except Exception as e:
+                # stays pending; redelivered by the startup claim/replay
+                print(f"[stream] XACK {entry_id!r} failed: {e}")
+        finally:
+            slots.release()  # always, or the consumer stalls in acquire()
+
+    async def dispatch(entries):
+        for entry_id, fields in entries:
+            await slots.acquire()
+            task = asyncio.create_task(run(entry_id, fields))
+            inflight.add(task)
+            task.add_done_callback(inflight.discard)
+
+    # Entries delivered but never acked (crash / restart) are only handed out
+    # again by id: claim other consumers' stale ones, then replay our own
+    # pending list before reading new entries.
+    start = "0-0"
+    while True:
+        # (justid=True would make redis-py drop the cursor)
+        start, _claimed, *_ = await r.xautoclaim(
+            STREAM, GROUP, consumer, CLAIM_IDLE_MS, start_id=start, count=BATCH
+        )
+        if start in (b"0-0", "0-0"):
+            break
+    last_id = "0"
+    while True:
+        resp = await r.xreadgroup(GROUP, consumer, {STREAM: last_id}, count=BATCH)
+        entries = resp[0][1] if resp else []
+        if not entries:
+            break
+        print(f"[stream] redelivering {len(entries)} pending entries")
+        await dispatch(entries)
+        last_id = entries[-1][0]
+
+    print(f"[stream] {consumer} listening on '{STREAM}' (group {GROUP}, {concurrency} in flight)…")
+    while True:
+        resp = await r.xreadgroup(GROUP, consumer, {STREAM: ">"}, count=BATCH, block=BLOCK_MS)
+        for _stream, entries in resp or []:
+            await dispatch(entries)
+
+def _run(main):
+    try:
+        import uvloop  # ships with uvicorn[standard]; plain asyncio otherwise
+        uvloop.install()
+    except ImportError:
+        pass
+    asyncio.run(main)
+
+if __name__ == "__main__":
+    _run(consume(os.getenv("STREAM_CONSUMER") or socket.gethostname()))
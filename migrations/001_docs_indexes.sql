@@ -0,0 +1,24 @@
+-- backend/migrations/001_docs_indexes.sql
+--
+-- Indexes backing the hot lookups in app/routes_docs.py.
+-- CREATE INDEX CONCURRENTLY cannot run inside a transaction block, so apply
+-- this file with autocommit, e.g.:  psql "$DATABASE_URL" -f migrations/001_docs_indexes.sql
+
+-- Open checklist items per contact (kickoff's pending labels, the
+-- "any required pending?" check in approve_doc). Partial on PENDING so the
+-- index only holds open items; INCLUDE lets the join/filter columns come
+-- straight from the index.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cd_pending
+    ON client_documents (contact_id)
+    INCLUDE (requirement_id, is_required)
+    WHERE status = 'PENDING';
+
+-- Portal token validation (portal_init / portal_upload). now() is not
+-- immutable, so the expiry filter stays in the query instead of the predicate.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_portal_tokens_token_expires
+    ON portal_tokens (token, expires_at);
+
+-- Latest provider message id per contact (kickoff threading).
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_messages_contact_provider_msgid
+    ON messages (contact_id, created_at DESC)
+    WHERE meta->>'provider_message_id' IS NOT NULL;
@@ -0,0 +1,24 @@
+-- backend/migrations/002_messages_contacts_indexes.sql
+--
+-- Indexes backing app/routes_messages.py and app/routes_webhooks.py.
+-- Same as 001: CONCURRENTLY, so apply with autocommit, e.g.:
+--   psql "$DATABASE_URL" -f migrations/002_messages_contacts_indexes.sql
+--
+-- The pending-checklist index (_draft_context's labels) is idx_cd_pending in 001.
+
+-- Thread loaders (get_thread, thread_by_message): all messages for a contact
+-- in created_at order.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_messages_contact_created
+    ON messages (contact_id, created_at);
+
+-- Inbound SMS contact lookup (twilio_sms). Not UNIQUE: leads and manual
+-- entry can already have put the same number on several contacts, and the
+-- webhook only needs the first match.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_contacts_phone
+    ON contacts (phone)
+    WHERE phone IS NOT NULL;
+
+-- Inbound email contact lookup (dev_email).
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_contacts_email
+    ON contacts (email)
+    WHERE email IS NOT NULL;
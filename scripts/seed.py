@@ -10,11 +10,18 @@ leads = [
   ("Dana","Lee","dana@example.com","+17025550103","Audit Letter"),
 ]
 
+# COPY streams every row in one command: no per-row Parse/Bind/Execute,
+# so the same script stays fast for 10k+ row seeds.
 with psycopg.connect(DB, row_factory=dict_row) as conn:
-    for f,l,e,p,m in leads:
-        conn.execute("""
-          insert into contacts (first_name,last_name,email,phone,matter_type)
-          values (%s,%s,%s,%s,%s)
-        """,(f,l,e,p,m))
+    # Dev seed data only: don't wait for the WAL fsync at commit. A crash
+    # right after could lose the seed (never corrupts anything), which is
+    # fine here -- don't copy this into request/worker code paths.
+    conn.execute("SET LOCAL synchronous_commit = off")
+    with conn.cursor() as cur:
+        with cur.copy(
+            "copy contacts (first_name,last_name,email,phone,matter_type) from stdin"
+        ) as copy:
+            for row in leads:
+                copy.write_row(row)
     conn.commit()
 print("Seeded", len(leads), "contacts")
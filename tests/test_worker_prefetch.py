@@ -0,0 +1,81 @@
+# backend/tests/test_worker_prefetch.py
+#
+# PrefetchWorker against an in-memory Redis (fakeredis; lupa for the Lua
+# prefetch script). Run with:  pytest tests/
+import importlib
+import sys
+
+import pytest
+import redis
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")
+
+from rq import SimpleWorker
+from rq.utils import get_version
+
+
+@pytest.fixture
+def ws(monkeypatch):
+    """worker_simple imported against a fresh fake Redis 7 server."""
+    server = fakeredis.FakeServer(version=(7,))
+    monkeypatch.setenv("REDIS_URL", "redis://fake")
+    monkeypatch.setenv("DATABASE_URL", "postgresql://u@127.0.0.1:1/x")
+    monkeypatch.setattr(
+        redis.BlockingConnectionPool,
+        "from_url",
+        classmethod(lambda cls, url, **kw: redis.ConnectionPool(
+            connection_class=fakeredis.FakeRedisConnection, server=server
+        )),
+    )
+    sys.modules.pop("worker_simple", None)
+    mod = importlib.import_module("worker_simple")
+    # fakeredis has no INFO, so rq would assume 5.0.9 (LPOP path); pin the
+    # version rq caches on the connection to take the LMOVE path
+    setattr(mod.rconn, "__rq_redis_server_version", (7, 0, 0))
+    yield mod
+    mod._log_listener.stop()
+    sys.modules.pop("worker_simple", None)
+
+
+def test_prefetched_jobs_survive_another_workers_maintenance(ws):
+    q = ws.q
+    assert get_version(ws.rconn) >= (6, 2, 0)  # LMOVE / intermediate-list path
+    jobs = [q.enqueue("os.getpid") for _ in range(5)]
+
+    a = ws.PrefetchWorker([q], connection=ws.rconn, name="a")
+    b = SimpleWorker([q], connection=ws.rconn, name="b")
+
+    job, queue = a.dequeue_job_and_maintain_ttl(timeout=1)
+    assert job.id == jobs[0].id
+    assert [job_id for _, job_id in a._prefetched] == [j.id for j in jobs[1:]]
+    a.execute_job(job, queue)
+
+    # a ran maintenance inside its dequeue; once that lock expires b takes it
+    # and runs clean_intermediate_queue while a still holds the buffered ids
+    ws.rconn.delete(q.registry_cleaning_key)
+    b.clean_registries()
+    assert ws.rconn.exists(q.registry_cleaning_key)
+    assert q.failed_job_registry.get_job_ids() == []
+
+    for expected in jobs[1:]:
+        job, queue = a.dequeue_job_and_maintain_ttl(timeout=1)
+        assert job.id == expected.id
+        a.execute_job(job, queue)
+
+    assert q.failed_job_registry.get_job_ids() == []
+    assert sorted(q.finished_job_registry.get_job_ids()) == sorted(j.id for j in jobs)
+    assert ws.rconn.llen(q.intermediate_queue_key) == 0
+
+
+def test_teardown_requeues_unstarted_ids(ws):
+    q = ws.q
+    jobs = [q.enqueue("os.getpid") for _ in range(3)]
+
+    a = ws.PrefetchWorker([q], connection=ws.rconn, name="a")
+    a.dequeue_job_and_maintain_ttl(timeout=1)
+    a.teardown()
+
+    assert q.job_ids == [j.id for j in jobs[1:]]
+    assert ws.rconn.lrange(q.intermediate_queue_key, 0, -1) == [jobs[0].id.encode()]
+    assert q.started_job_registry.get_job_ids() == []
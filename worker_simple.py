@@ -1,11 +1,23 @@
 # backend/worker_simple.py
 import os, sys
-import sys, os
-sys.path.insert(0, os.path.dirname(__file__))  # ensure /backend is on sys.path
-import app.jobs  # makes functions importable for RQ
+import logging
+import logging.handlers
 from pathlib import Path
+from queue import SimpleQueue
 from dotenv import load_dotenv
 
+# --- Logging: records go through an in-memory queue and a listener thread
+# writes them to stdout, so a slow/blocked stdout pipe never stalls the worker.
+_log_handler = logging.StreamHandler(sys.stdout)
+_log_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+_log_queue: SimpleQueue = SimpleQueue()
+_log_listener = logging.handlers.QueueListener(_log_queue, _log_handler)
+_log_listener.start()
+_queue_handler = logging.handlers.QueueHandler(_log_queue)
+_queue_handler.setFormatter(logging.Formatter("%(message)s"))  # listener adds the prefix
+logging.basicConfig(level=logging.INFO, handlers=[_queue_handler])
+log = logging.getLogger("worker")
+
 # --- Load envs (backend/.env) ---
 BASE_DIR = Path(__file__).resolve().parent  # .../backend
 load_dotenv(dotenv_path=BASE_DIR / ".env", override=True)
@@ -15,37 +27,203 @@ load_dotenv(dotenv_path=BASE_DIR / ".env", override=True)
 if str(BASE_DIR) not in sys.path:
     sys.path.insert(0, str(BASE_DIR))
 
-# Optional: verify we can import app.jobs now (prints once at start)
+# Import app.jobs up front so RQ can resolve "app.jobs.*" string jobs
 try:
     import app.jobs  # noqa: F401
 except Exception as e:
-    print("[worker] Could not import app.jobs. sys.path is:")
-    for p in sys.path:
-        print("   ", p)
+    log.error("Could not import app.jobs. sys.path is: %s", sys.path)
     raise
 
 # --- Redis / RQ setup ---
+import socket
+from collections import deque
 import redis
 from rq import SimpleWorker, Queue
+from rq.defaults import DEFAULT_WORKER_TTL
+from rq.exceptions import NoSuchJobError
+from rq.scheduler import RQScheduler, run as run_scheduler
+from rq.utils import current_timestamp, get_version
 
 REDIS_URL = os.getenv("REDIS_URL")
 if not REDIS_URL:
     raise RuntimeError("REDIS_URL not set in environment")
 
-# Works with rediss:// (TLS)
-rconn = redis.from_url(REDIS_URL, decode_responses=False)
+# TCP keepalive so idle (TLS) connections aren't silently dropped and
+# re-handshaked; the TCP_KEEP* knobs don't all exist on macOS, so only set
+# the ones this platform has.
+_KEEPALIVE_OPTS = {
+    opt: val
+    for name, val in (("TCP_KEEPIDLE", 30), ("TCP_KEEPINTVL", 10), ("TCP_KEEPCNT", 3))
+    if (opt := getattr(socket, name, None)) is not None
+}
+
+
+class _NoEvictMixin:
+    """Opt each new connection out of Redis 7 client eviction (maxmemory-clients),
+    so the idle blocking dequeue isn't the first thing dropped under memory
+    pressure. Older / managed servers that reject the command are fine."""
+
+    def on_connect(self):
+        super().on_connect()
+        try:
+            self.send_command("CLIENT", "NO-EVICT", "ON")
+            self.read_response()
+        except redis.exceptions.ResponseError:
+            pass
+
+
+class _NoEvictConnection(_NoEvictMixin, redis.Connection):
+    pass
+
+
+class _NoEvictSSLConnection(_NoEvictMixin, redis.SSLConnection):
+    pass
+
+
+# rq's dequeue blocks on BLMOVE (BLPOP before Redis 6.2, or with several
+# queues) for up to worker_ttl - 15s, so reads must be allowed to wait past
+# that. This is the value Worker._set_connection would put on the pool anyway
+# (dequeue timeout + 10s) when none is set; spelled out so it's visible.
+SOCKET_TIMEOUT = (DEFAULT_WORKER_TTL - 15) + 10
+
+# Works with rediss:// (TLS).
+# connection_class overrides the one from_url picks, so keep the TLS choice here.
+rpool = redis.BlockingConnectionPool.from_url(
+    REDIS_URL,
+    socket_timeout=SOCKET_TIMEOUT,
+    connection_class=(
+        _NoEvictSSLConnection if REDIS_URL.startswith("rediss://") else _NoEvictConnection
+    ),
+    client_name="rq-outbound-worker",  # CLIENT SETNAME on every (re)connect
+    max_connections=16,
+    socket_keepalive=True,
+    socket_keepalive_options=_KEEPALIVE_OPTS,
+    health_check_interval=30,
+    decode_responses=False,
+)
+rconn = redis.Redis(connection_pool=rpool)
+
+# Outbound queue only (no forking -> mac-safe)
+q = Queue("outbound", connection=rconn)
 
-# Fail fast if bad URL / network
+# Fail fast if bad URL / network; report the backlog in the same round-trip
 try:
-    rconn.ping()
-    print("[worker] Connected to Redis.")
+    pipe = rconn.pipeline(transaction=False)
+    pipe.ping()
+    pipe.llen(q.key)
+    _, depth = pipe.execute()
+    log.info("Connected to Redis; %d job(s) waiting on '%s'.", depth, q.name)
 except Exception as e:
     raise RuntimeError(f"[worker] Redis connection failed: {e}")
 
-# Outbound queue only (no forking -> mac-safe)
-q = Queue("outbound", connection=rconn)
+# Extra job ids pulled per dequeue (1 = plain SimpleWorker behaviour)
+PREFETCH = max(1, int(os.getenv("WORKER_PREFETCH", "8")))
+
+
+# Moves up to ARGV[1] ids off the queue (LMOVE into the intermediate list, as
+# RQ's own dequeue does, or plain LPOP before Redis 6.2) and registers each in
+# StartedJobRegistry until ARGV[2], all atomically: no other worker's
+# clean_intermediate_queue can see an id that isn't registered yet.
+_PREFETCH_LUA = """
+local ids = {}
+for i = 1, tonumber(ARGV[1]) do
+  local id
+  if ARGV[3] == '1' then
+    id = redis.call('LMOVE', KEYS[1], KEYS[2], 'LEFT', 'RIGHT')
+  else
+    id = redis.call('LPOP', KEYS[1])
+  end
+  if not id then break end
+  redis.call('ZADD', KEYS[3], ARGV[2], id)
+  ids[#ids + 1] = id
+end
+return ids
+"""
+
+
+class PrefetchWorker(SimpleWorker):
+    """
+    SimpleWorker that, after each blocking dequeue, grabs up to PREFETCH-1
+    more job ids in one round-trip and works through them before touching
+    Redis for the queue again.
+
+    Prefetched ids sit in the queue's intermediate list (like RQ's own
+    dequeue) *and* in StartedJobRegistry, so no worker's maintenance treats
+    them as stuck. Their registry expiry covers the job currently running
+    and is pushed out each time the next buffered job starts; if this worker
+    dies, they expire and RQ fails/retries them like any abandoned job. A
+    normal shutdown puts unstarted ids back at the head of the queue.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._prefetched: deque = deque()  # (queue, job_id)
+        self._prefetch_script = self.connection.register_script(_PREFETCH_LUA)
+
+    def dequeue_job_and_maintain_ttl(self, timeout, max_idle_time=None):
+        while self._prefetched:
+            queue, job_id = self._prefetched.popleft()
+            try:
+                job = self.job_class.fetch(job_id, connection=self.connection, serializer=self.serializer)
+            except NoSuchJobError:
+                pipe = self.connection.pipeline()
+                pipe.lrem(queue.intermediate_queue_key, 1, job_id)
+                pipe.zrem(queue.started_job_registry.key, job_id)
+                pipe.execute()
+                continue
+            self._hold_prefetched(job)
+            return job, queue
+
+        result = super().dequeue_job_and_maintain_ttl(timeout, max_idle_time)
+        if result is not None and PREFETCH > 1 and len(self.queues) == 1:
+            self._prefetch(*result)
+        return result
+
+    def _prefetch(self, job, queue):
+        ids = self._prefetch_script(
+            keys=[queue.key, queue.intermediate_queue_key, queue.started_job_registry.key],
+            args=[
+                PREFETCH - 1,
+                current_timestamp() + self.get_heartbeat_ttl(job),
+                1 if get_version(self.connection) >= (6, 2, 0) else 0,
+            ],
+        )
+        for job_id in ids:
+            self._prefetched.append((queue, job_id.decode() if isinstance(job_id, bytes) else job_id))
+
+    def _hold_prefetched(self, job):
+        """Keep buffered ids registered for as long as ``job`` may run."""
+        if not self._prefetched:
+            return
+        expires = current_timestamp() + self.get_heartbeat_ttl(job)
+        pipe = self.connection.pipeline(transaction=False)
+        for queue, job_id in self._prefetched:
+            pipe.zadd(queue.started_job_registry.key, {job_id: expires})
+        pipe.execute()
+
+    def teardown(self):
+        if self._prefetched:
+            pipe = self.connection.pipeline()
+            for queue, job_id in reversed(self._prefetched):
+                pipe.lrem(queue.intermediate_queue_key, 1, job_id)
+                pipe.zrem(queue.started_job_registry.key, job_id)
+                pipe.lpush(queue.key, job_id)
+            pipe.execute()
+            self._prefetched.clear()
+        super().teardown()
 
 if __name__ == "__main__":
-    w = SimpleWorker([q], connection=rconn)
-    print("[worker] Listening on 'outbound'…")
-    w.work(burst=False)  # keep running
\ No newline at end of file
+    try:
+        if "--scheduler" in sys.argv[1:]:
+            # Moves enqueue_at() jobs onto the queue when due. Its own process
+            # (python worker_simple.py --scheduler), in the foreground: rq's
+            # with_scheduler=True would multiprocessing-start it from the
+            # worker, which forks, and can't pickle it under macOS's spawn.
+            log.info("Scheduler for 'outbound' starting…")
+            run_scheduler(RQScheduler([q], connection=rconn))
+        else:
+            w = PrefetchWorker([q], connection=rconn)
+            log.info("Listening on 'outbound'…")
+            w.work(burst=False)  # keep running
+    finally:
+        _log_listener.stop()  # flush queued records
\ No newline at end of file